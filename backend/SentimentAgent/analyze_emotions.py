@@ -1,71 +1,177 @@
-from transformers import pipeline
+# analyze_emotions.py - the sentiment service's HTTP API and uAgent. Started by main.py.
+import asyncio
+import os
+import sys
+import threading
+
 from fastapi import FastAPI, Request
-import uvicorn
-
-from uagents import Agent, Context, Bureau
-
-# Load emotion detection model
-emotion_model = pipeline("text-classification", model="bhadresh-savani/distilbert-base-uncased-emotion")
-
-def analyze_text_metrics(text):
-    results = emotion_model(text)
-    text_lower = text.lower()
-
-    suicide_keywords = ["kill myself", "suicidal", "die", "ending it", "pills", "overdose", "no way out"]
-    psychosis_keywords = ["voices", "hallucinate", "not real", "they’re watching me", "i’m not me"]
-
-    metrics = {
-        "self_harm": 0,
-        "homicidal": 0,
-        "distress": 0,
-        "psychosis": 0
-    }
-
-    for result in results:
-        label = result['label']
-        score = result['score']
-        if label == 'sadness':
-            metrics["self_harm"] += score
-            metrics["distress"] += score * 0.6
-        elif label in ['anger', 'fear']:
-            metrics["homicidal"] += score
-            metrics["distress"] += score * 0.5
-        elif label == 'joy':
-            metrics["psychosis"] += score * 0.3
-        elif label == 'surprise':
-            metrics["psychosis"] += score * 0.5
-
-    if any(word in text_lower for word in suicide_keywords):
-        metrics["self_harm"] = max(metrics["self_harm"], 0.8)
-    if any(word in text_lower for word in psychosis_keywords):
-        metrics["psychosis"] = max(metrics["psychosis"], 0.8)
-
-    for k in metrics:
-        metrics[k] = round(min(metrics[k] * 100, 100), 2)
-
-    return metrics
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from uagents import Agent, Context
+
+from audio_features import AudioAnalyzer, fuse_metrics, recording_url_allowed
+from batcher import MicroBatcher, Overloaded
+from emotion_scoring import score_batch
+from inference_backends import EmotionModel
+from inference_pool import InferencePool
+from instrumentation import PROMETHEUS_CONTENT_TYPE, get_logger, metrics, span
+from result_cache import ResultCache
+
+log = get_logger("sentiment")
+
+# Emotion detection model, loaded and warmed up in the background (see /health).
+# INFERENCE_BACKEND picks pytorch, torch-int8, onnx or onnx-int8.
+emotion_model = EmotionModel(os.getenv("INFERENCE_BACKEND", "pytorch"))
+
+# INFERENCE_WORKERS > 0 runs the model in that many worker processes instead (inference_pool.py),
+# each with INFERENCE_THREADS threads (default: the cores split evenly between the workers)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+inference_pool = InferencePool(
+    emotion_model.backend, INFERENCE_WORKERS, int(os.getenv("INFERENCE_THREADS", "0")) or None
+) if INFERENCE_WORKERS > 0 else None
+
+def analyze_text_metrics_batch(texts):
+    return score_batch(emotion_model, texts)
+
+def model_status():
+    return inference_pool.status() if inference_pool else emotion_model.status()
+
+def model_ready():
+    return inference_pool.ready() if inference_pool else emotion_model.ready.is_set()
+
+# Vapi re-sends the same transcripts (overlapping speech-updates, repeated final reports),
+# so results are kept for RESULT_CACHE_TTL seconds. Lexicon edits show up once entries expire.
+result_cache = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_SIZE", "2048")),
+    ttl=float(os.getenv("RESULT_CACHE_TTL", "300")),
+)
+
+# Prosody features of the call recording, extracted in worker processes so audio DSP
+# never blocks text inference. AUDIO_WEIGHT is the audio share of the fused metrics.
+audio_analyzer = AudioAnalyzer(workers=int(os.getenv("AUDIO_WORKERS", "1")))
+AUDIO_WEIGHT = float(os.getenv("AUDIO_WEIGHT", "0.3"))
+# Hosts audio_url may point at (comma separated, ".example.com" for subdomains); the
+# service fetches these URLs itself, so anything else is refused
+AUDIO_URL_HOSTS = [h.strip().lower() for h in os.getenv("AUDIO_URL_HOSTS", "storage.vapi.ai").split(",") if h.strip()]
+
+async def analyze_recording(audio_url):
+    try:
+        with span("audio_analysis"):
+            return await audio_analyzer.analyze(audio_url, AUDIO_URL_HOSTS)
+    except Exception as e:
+        log.error("❌ Audio analysis failed for %s: %s", audio_url, e)
+        return None
+
+def fuse_audio(text_result, audio):
+    """Text metrics blended with the recording's metrics; the cached text result is left untouched."""
+    if audio is None:
+        return text_result
+    fused = fuse_metrics(text_result, audio["metrics"], AUDIO_WEIGHT)
+    return {**text_result, **fused, "text_metrics": {k: text_result[k] for k in fused}, "audio": audio}
+
+metrics.counter("serenity_result_cache_hits_total", "Analyses served from the result cache", fn=lambda: result_cache.hits)
+metrics.counter("serenity_result_cache_misses_total", "Analyses that went to the model", fn=lambda: result_cache.misses)
+metrics.counter("serenity_result_cache_coalesced_total", "Analyses that joined one in flight", fn=lambda: result_cache.coalesced)
 
 # Define uAgent
 agent = Agent(name="sentiment_agent")
 
+# The Bureau runs its own event loop in another thread. Agent messages are handed to the
+# HTTP server's loop, so they share its batcher, workers and cache and never run the model
+# on the agent's loop.
+server_loop = None
+server_started = threading.Event()
+
 @agent.on_message()
 async def handle_message(ctx: Context, sender: str, msg: str):
-    metrics = analyze_text_metrics(msg)
+    if not server_started.is_set():
+        await asyncio.to_thread(server_started.wait)
+    future = asyncio.run_coroutine_threadsafe(result_cache.get_or_compute(msg, batcher.submit), server_loop)
+    try:
+        metrics = await asyncio.wrap_future(future)
+    except Overloaded:
+        metrics = {"error": "Too many requests waiting for the model"}
     await ctx.send(sender, str(metrics))
 
 # FastAPI wrapper
 app = FastAPI()
 
+# Concurrent POST / requests are grouped into one batched forward pass. Past BATCH_MAX_QUEUE
+# waiting requests new ones get a 503 instead of queueing, except end-of-call (priority) ones.
+# With inference workers every worker gets a batch of its own.
+batcher = MicroBatcher(
+    inference_pool.score_batch if inference_pool else analyze_text_metrics_batch,
+    max_batch_size=int(os.getenv("BATCH_MAX_SIZE", "16")),
+    max_wait_ms=float(os.getenv("BATCH_MAX_WAIT_MS", "10")),
+    max_queue=int(os.getenv("BATCH_MAX_QUEUE", "256")),
+    concurrency=INFERENCE_WORKERS or 1,
+)
+metrics.gauge("serenity_batch_queue_depth", "Requests waiting for a model batch", fn=lambda: batcher.depth())
+metrics.counter("serenity_batch_rejected_total", "Requests turned away because the batch queue was full", fn=lambda: batcher.stats.rejected)
+metrics.gauge("serenity_model_ready", "1 once the emotion model is loaded", fn=lambda: int(model_ready()))
+
+@app.on_event("startup")
+async def start_batcher():
+    global server_loop
+    if inference_pool:
+        inference_pool.start()
+    else:
+        emotion_model.start_loading()
+    batcher.start()
+    server_loop = asyncio.get_running_loop()
+    server_started.set()
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.stop()
+    audio_analyzer.shutdown()
+    if inference_pool:
+        inference_pool.shutdown()
+
+@app.get("/health")
+async def health():
+    status = model_status()
+    return JSONResponse(status, status_code=200 if status["status"] == "ready" else 503)
+
 @app.post("/")
 async def analyze_text(request: Request):
+    if not model_ready():
+        return JSONResponse({"error": "Model is not ready", **model_status()}, status_code=503)
+
     data = await request.json()
     text = data.get("text", "")
-    result = analyze_text_metrics(text)
-    return result
+    audio_url = data.get("audio_url")
+    priority = bool(data.get("priority"))
+    if audio_url and not recording_url_allowed(audio_url, AUDIO_URL_HOSTS):
+        log.warning("⚠️ Refused audio_url outside AUDIO_URL_HOSTS: %s", audio_url)
+        return JSONResponse({"error": "audio_url must be an http(s) URL on an allowed recording host"}, status_code=400)
+
+    # Identical texts arriving together share one pass through the batcher
+    compute = lambda t: batcher.submit(t, priority=priority)
+    try:
+        if not audio_url:
+            return await result_cache.get_or_compute(text, compute)
+
+        result, audio = await asyncio.gather(
+            result_cache.get_or_compute(text, compute),
+            analyze_recording(audio_url),
+        )
+    except Overloaded:
+        return JSONResponse({"error": "Too many requests waiting for the model"}, status_code=503, headers={"Retry-After": "1"})
+    return fuse_audio(result, audio)
+
+@app.get("/batch-stats")
+async def batch_stats():
+    return batcher.stats.snapshot()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return result_cache.stats()
 
-# Run both FastAPI and agent
+# Worker processes re-import the main module, which must not be this one (see main.py)
 if __name__ == "__main__":
-    bureau = Bureau()
-    bureau.add(agent)
-    bureau.run_in_thread()
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    sys.exit("Start the sentiment service with: python3 main.py")
@@ -0,0 +1,335 @@
+# audio_features.py - streaming prosody features of call audio and their mapping to risk metrics
+#
+#   python audio_features.py call.wav [more.wav ...]
+#   python audio_features.py call.pcm --pcm-rate 8000
+#
+# Audio is read block by block, so memory use is bounded by the block size whatever
+# the length of the recording.
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+METRIC_KEYS = ("self_harm", "homicidal", "distress", "psychosis")
+
+FRAME_MS = 40
+HOP_MS = 10
+MIN_PITCH_HZ = 60
+MAX_PITCH_HZ = 400
+# Frames quieter than this (dBFS) count as silence / pauses
+SILENCE_DB = -45.0
+# Normalized autocorrelation a frame needs at its pitch lag to count as voiced
+VOICING_THRESHOLD = 0.5
+# Headerless .pcm / .raw files are 16-bit little-endian mono at this rate unless told otherwise
+PCM_SAMPLE_RATE = 16000
+MAX_DOWNLOAD_BYTES = 200 * 1024 * 1024
+
+
+class RunningStats:
+    """Count, mean and variance merged block by block (Chan et al.), without keeping the values."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values):
+        n = len(values)
+        if n == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    @property
+    def std(self):
+        return (self._m2 / self.count) ** 0.5 if self.count else 0.0
+
+
+class AudioFeatureStream:
+    """
+    Pitch, energy, speaking rate and jitter, computed incrementally from blocks of mono samples.
+
+    Each block is cut into overlapping frames and all frames are processed at once:
+    RMS energy, and pitch from an FFT autocorrelation. Only running statistics and a
+    frame's worth of leftover samples are kept between blocks.
+
+    Speaking rate is approximated by voiced-segment onsets per second (roughly one per
+    syllable); jitter is the mean period change between consecutive voiced frames
+    relative to the mean period.
+    """
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.frame_length = int(sample_rate * FRAME_MS / 1000)
+        self.hop = int(sample_rate * HOP_MS / 1000)
+        self.min_lag = max(1, int(sample_rate / MAX_PITCH_HZ))
+        self.max_lag = min(self.frame_length - 2, int(sample_rate / MIN_PITCH_HZ))
+        self._fft_size = 1 << (2 * self.frame_length - 1).bit_length()
+        self._window = np.hanning(self.frame_length).astype(np.float32)
+        self._pending = np.zeros(0, dtype=np.float32)
+
+        self.frames = 0
+        self.active_frames = 0
+        self.onsets = 0
+        self.pitch = RunningStats()
+        self.energy = RunningStats()
+        self._jitter_sum = 0.0
+        self._jitter_pairs = 0
+        self._period_sum = 0.0
+        self._last_voiced = False
+        self._last_period = None
+
+    def feed(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 2:
+            samples = samples.mean(axis=1)
+        buffer = np.concatenate([self._pending, samples])
+        if len(buffer) < self.frame_length:
+            self._pending = buffer
+            return
+
+        count = 1 + (len(buffer) - self.frame_length) // self.hop
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, self.frame_length)[::self.hop][:count]
+        self._pending = buffer[count * self.hop:].copy()
+        self._process(frames)
+
+    def _process(self, frames):
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        db = 20 * np.log10(rms + 1e-10)
+        active = db > SILENCE_DB
+
+        # Autocorrelation of every frame at once via the power spectrum
+        centered = (frames - frames.mean(axis=1, keepdims=True)) * self._window
+        spectrum = np.fft.rfft(centered, n=self._fft_size, axis=1)
+        autocorr = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, n=self._fft_size, axis=1)
+        energy0 = autocorr[:, 0]
+        lags = autocorr[:, self.min_lag:self.max_lag + 1]
+        best = lags.argmax(axis=1)
+        rows = np.arange(len(frames))
+        strength = lags[rows, best] / np.maximum(energy0, 1e-12)
+
+        # Parabolic interpolation around the peak for sub-sample lag precision
+        left = lags[rows, np.maximum(best - 1, 0)]
+        right = lags[rows, np.minimum(best + 1, lags.shape[1] - 1)]
+        peak = lags[rows, best]
+        curvature = left - 2 * peak + right
+        offset = 0.5 * (left - right) / np.where(np.abs(curvature) > 1e-12, curvature, np.inf)
+        period = (best + self.min_lag + np.clip(offset, -0.5, 0.5)) / self.sample_rate
+
+        voiced = active & (strength > VOICING_THRESHOLD)
+
+        self.frames += len(frames)
+        self.active_frames += int(active.sum())
+        self.energy.update(db[active])
+        self.pitch.update(1.0 / period[voiced])
+
+        # Onsets: unvoiced -> voiced transitions, continuing from the previous block
+        previous = np.concatenate([[self._last_voiced], voiced[:-1]])
+        self.onsets += int((voiced & ~previous).sum())
+
+        # Jitter over runs of consecutive voiced frames, including a run crossing the block edge
+        voiced_periods = np.where(voiced, period, np.nan)
+        if self._last_voiced and self._last_period is not None:
+            voiced_periods = np.concatenate([[self._last_period], voiced_periods])
+        diffs = np.abs(np.diff(voiced_periods))
+        pairs = ~np.isnan(diffs)
+        self._jitter_sum += float(diffs[pairs].sum())
+        self._jitter_pairs += int(pairs.sum())
+        self._period_sum += float(period[voiced].sum())
+
+        self._last_voiced = bool(voiced[-1])
+        self._last_period = float(period[-1]) if voiced[-1] else None
+
+    def summary(self):
+        duration = self.frames * self.hop / self.sample_rate
+        mean_period = self._period_sum / self.pitch.count if self.pitch.count else 0.0
+        return {
+            "duration_s": round(duration, 2),
+            "voiced_ratio": round(self.pitch.count / self.frames, 3) if self.frames else 0.0,
+            "pause_ratio": round(1 - self.active_frames / self.frames, 3) if self.frames else 0.0,
+            "pitch_mean_hz": round(self.pitch.mean, 1),
+            "pitch_std_hz": round(self.pitch.std, 1),
+            "energy_mean_db": round(self.energy.mean, 1),
+            "energy_std_db": round(self.energy.std, 1),
+            "speaking_rate": round(self.onsets / duration, 2) if duration else 0.0,
+            "jitter": round(self._jitter_sum / self._jitter_pairs / mean_period, 4)
+            if self._jitter_pairs and mean_period else 0.0,
+        }
+
+
+def _is_raw_pcm(path):
+    return path.lower().endswith((".pcm", ".raw"))
+
+
+def extract_features(path, block_seconds=1.0, pcm_sample_rate=PCM_SAMPLE_RATE):
+    """Prosody features of an audio file, read in blocks of block_seconds."""
+    if _is_raw_pcm(path):
+        sample_rate = pcm_sample_rate
+        raw = {"samplerate": sample_rate, "channels": 1, "subtype": "PCM_16", "format": "RAW", "endian": "LITTLE"}
+    else:
+        sample_rate = sf.info(path).samplerate
+        raw = {}
+
+    stream = AudioFeatureStream(sample_rate)
+    blocksize = int(sample_rate * block_seconds)
+    for block in sf.blocks(path, blocksize=blocksize, dtype="float32", always_2d=True, **raw):
+        stream.feed(block)
+    return stream.summary()
+
+
+def _scale(value, low, high):
+    return min(max((value - low) / (high - low), 0.0), 1.0)
+
+
+def audio_risk_metrics(features):
+    """
+    Map prosody features to the four risk metrics (0-100), or None if there is too little speech.
+
+    Heuristic and deliberately conservative; prosody alone is weak evidence, which is why it
+    only contributes AUDIO_WEIGHT of the fused score.
+    """
+    if features["duration_s"] < 1.0 or features["voiced_ratio"] < 0.05:
+        return None
+
+    pitch_variation = features["pitch_std_hz"] / features["pitch_mean_hz"] if features["pitch_mean_hz"] else 0.0
+    monotone = 1 - _scale(pitch_variation, 0.05, 0.25)
+    slow = 1 - _scale(features["speaking_rate"], 1.5, 4.0)
+    fast = _scale(features["speaking_rate"], 3.5, 6.0)
+    quiet = 1 - _scale(features["energy_mean_db"], -40, -22)
+    loud = _scale(features["energy_mean_db"], -30, -12)
+    pauses = _scale(features["pause_ratio"], 0.3, 0.7)
+    volatile = _scale(features["energy_std_db"], 6, 14)
+    shaky = _scale(features["jitter"], 0.01, 0.05)
+    erratic = _scale(pitch_variation, 0.25, 0.5)
+
+    metrics = {
+        "self_harm": (monotone + slow + quiet + pauses) / 4,
+        "homicidal": (loud + fast + volatile) / 3,
+        "distress": (shaky + erratic + volatile) / 3,
+        "psychosis": (erratic + pauses) / 2,
+    }
+    return {k: round(v * 100, 2) for k, v in metrics.items()}
+
+
+def fuse_metrics(text_metrics, audio_metrics, audio_weight):
+    """Weighted blend of text and audio scores; the text scores alone when there are no audio scores."""
+    if not audio_metrics:
+        return {k: text_metrics[k] for k in METRIC_KEYS}
+    return {
+        k: round((1 - audio_weight) * text_metrics[k] + audio_weight * audio_metrics[k], 2)
+        for k in METRIC_KEYS
+    }
+
+
+def recording_url_allowed(url, hosts):
+    """
+    Whether url is an http(s) URL on one of hosts. An entry starting with "." matches
+    that domain's subdomains, e.g. ".vapi.ai".
+    """
+    parsed = urllib.parse.urlparse(url)
+    host = (parsed.hostname or "").lower()
+    if parsed.scheme not in ("http", "https") or not host:
+        return False
+    return any(host == h or (h.startswith(".") and host.endswith(h)) for h in hosts)
+
+
+class _AllowedRedirects(urllib.request.HTTPRedirectHandler):
+    """Follows redirects only to hosts the recording URL itself could have been on."""
+
+    def __init__(self, hosts):
+        self.hosts = hosts
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not recording_url_allowed(newurl, self.hosts):
+            raise urllib.error.HTTPError(newurl, code, "Redirected outside the allowed hosts", headers, fp)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def _download(url, hosts=None):
+    suffix = os.path.splitext(urllib.parse.urlparse(url).path)[1] or ".wav"
+    handlers = [_AllowedRedirects(hosts)] if hosts is not None else []
+    opener = urllib.request.build_opener(*handlers)
+    f = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        with f, opener.open(url, timeout=30) as response:
+            copied = 0
+            while True:
+                chunk = response.read(1 << 16)
+                if not chunk:
+                    break
+                copied += len(chunk)
+                if copied > MAX_DOWNLOAD_BYTES:
+                    raise ValueError(f"Recording is larger than {MAX_DOWNLOAD_BYTES} bytes")
+                f.write(chunk)
+        return f.name
+    except BaseException:
+        os.unlink(f.name)
+        raise
+
+
+def analyze_audio(source, hosts=None):
+    """
+    Features and risk metrics for a local file or http(s) recording URL. Runs in a worker
+    process. With hosts, the download may only be redirected to those (recording_url_allowed).
+    """
+    path = source
+    if source.startswith(("http://", "https://")):
+        path = _download(source, hosts)
+    try:
+        features = extract_features(path)
+    finally:
+        if path != source:
+            os.unlink(path)
+    return {"features": features, "metrics": audio_risk_metrics(features)}
+
+
+class AudioAnalyzer:
+    """
+    Runs analyze_audio in a pool of worker processes so audio DSP never holds up the
+    event loop or competes with text inference for the GIL.
+    """
+
+    def __init__(self, workers=1):
+        self.workers = workers
+        self._pool = None
+
+    def _executor(self):
+        if self._pool is None:
+            # spawn: workers start clean instead of forking a process that holds the emotion model
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def analyze(self, source, hosts=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor(), analyze_audio, source, hosts)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--pcm-rate" in args:
+        position = args.index("--pcm-rate")
+        PCM_SAMPLE_RATE = int(args[position + 1])
+        del args[position:position + 2]
+    for name in args:
+        features = extract_features(name, pcm_sample_rate=PCM_SAMPLE_RATE)
+        print(name)
+        print(json.dumps({"features": features, "metrics": audio_risk_metrics(features)}, indent=2))
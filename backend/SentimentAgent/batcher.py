@@ -0,0 +1,185 @@
+import asyncio
+import itertools
+import time
+from collections import Counter, deque
+
+
+class Overloaded(Exception):
+    """Raised by MicroBatcher.submit when max_queue normal-priority requests are already waiting."""
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class BatchStats:
+    """Running batch size / queue wait figures, kept over a bounded window of recent requests."""
+
+    def __init__(self, window=5000):
+        self.batches = 0
+        self.requests = 0
+        self.failed_batches = 0
+        self.rejected = 0
+        self.batch_sizes = Counter()
+        self.queue_wait_ms = deque(maxlen=window)
+        self.inference_ms = deque(maxlen=window)
+
+    def record(self, batch_size, waits_ms, inference_ms, failed=False):
+        self.batches += 1
+        self.requests += batch_size
+        if failed:
+            self.failed_batches += 1
+        self.batch_sizes[batch_size] += 1
+        self.queue_wait_ms.extend(waits_ms)
+        self.inference_ms.append(inference_ms)
+
+    def snapshot(self):
+        waits = list(self.queue_wait_ms)
+        inference = list(self.inference_ms)
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "failed_batches": self.failed_batches,
+            "rejected": self.rejected,
+            "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else 0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "queue_wait_ms": {
+                "p50": round(_percentile(waits, 50), 2),
+                "p95": round(_percentile(waits, 95), 2),
+                "p99": round(_percentile(waits, 99), 2),
+                "max": round(max(waits), 2) if waits else 0.0,
+            },
+            "inference_ms": {
+                "p50": round(_percentile(inference, 50), 2),
+                "p99": round(_percentile(inference, 99), 2),
+            },
+        }
+
+
+class MicroBatcher:
+    """
+    Groups concurrent requests into a single call to batch_fn.
+
+    A batch is flushed as soon as it holds max_batch_size items or max_wait_ms has
+    passed since its first item arrived. batch_fn receives a list of items and must
+    return a list of results in the same order; a plain function runs in the default
+    executor so the event loop keeps accepting requests while the model is busy, a
+    coroutine function (e.g. a dispatch to worker processes) is awaited. Up to
+    concurrency batches run at once; the next batch is only collected once one can
+    start, so requests keep joining it meanwhile.
+
+    Priority items are batched ahead of everything else and are always accepted; once
+    max_queue normal items are waiting, further ones are rejected with Overloaded
+    (0 leaves the queue unbounded).
+    """
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10, max_queue=0, concurrency=1):
+        self.batch_fn = batch_fn
+        self.concurrency = max(1, int(concurrency))
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.max_queue = max(0, int(max_queue))
+        self.stats = BatchStats()
+        self._queue = None
+        self._worker = None
+        self._order = itertools.count()
+        self._waiting_normal = 0
+        self._running = set()
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.PriorityQueue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def depth(self):
+        """Requests waiting for a batch."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def fill(self):
+        """Fraction of max_queue taken by waiting normal-priority requests (0 when unbounded)."""
+        return min(1.0, self._waiting_normal / self.max_queue) if self.max_queue else 0.0
+
+    async def submit(self, item, priority=False):
+        self.start()
+        if not priority:
+            if self.max_queue and self._waiting_normal >= self.max_queue:
+                self.stats.rejected += 1
+                raise Overloaded(f"{self._waiting_normal} requests already waiting")
+            self._waiting_normal += 1
+        future = asyncio.get_running_loop().create_future()
+        # Lane first so priority items sort ahead; the counter keeps each lane FIFO
+        self._queue.put_nowait((0 if priority else 1, next(self._order), item, future, time.perf_counter()))
+        return await future
+
+    def _take(self, entry):
+        if entry[0]:
+            self._waiting_normal -= 1
+        return entry[2:]
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [self._take(await self._queue.get())]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Anything already queued joins immediately; otherwise wait out the window.
+            if not self._queue.empty():
+                batch.append(self._take(self._queue.get_nowait()))
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._take(await asyncio.wait_for(self._queue.get(), remaining)))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            await slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                slots.release()
+                raise
+            task = loop.create_task(self._process(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _process(self, batch):
+        started = time.perf_counter()
+        waits_ms = [(started - enqueued) * 1000 for _, _, enqueued in batch]
+        items = [item for item, _, _ in batch]
+
+        try:
+            if asyncio.iscoroutinefunction(self.batch_fn):
+                results = await self.batch_fn(items)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(None, self.batch_fn, items)
+        except Exception as e:
+            self.stats.record(len(batch), waits_ms, (time.perf_counter() - started) * 1000, failed=True)
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats.record(len(batch), waits_ms, (time.perf_counter() - started) * 1000)
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
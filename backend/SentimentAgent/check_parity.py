@@ -0,0 +1,100 @@
+# check_parity.py - compare an inference backend against the reference PyTorch pipeline
+#
+#   python check_parity.py onnx-int8
+#   python check_parity.py torch-int8 --texts my_transcripts.txt --min-agreement 0.97
+#
+# Exits non-zero when top-label agreement or metric drift is outside the allowed range.
+import argparse
+import statistics
+import sys
+import time
+
+from emotion_scoring import metrics_from_results
+from inference_backends import load_pipeline
+
+SAMPLE_TEXTS = [
+    "I want to kill myself, there is no way out.",
+    "I've been feeling really down lately and I can't get out of bed.",
+    "I'm so angry at him, I could hurt someone.",
+    "I'm scared, I think someone is following me.",
+    "I hear voices telling me I'm not real.",
+    "Thanks for listening, I actually feel a bit better now.",
+    "I took some pills earlier, I don't know how many.",
+    "Everything is fine, I just wanted to talk to someone.",
+    "I can't stop crying and I don't know why.",
+    "They're watching me through the walls, I know it.",
+    "I'm surprised anyone picked up at this hour.",
+    "My name is Sam and I lost my job today.",
+    "I keep thinking about ending it all.",
+    "I feel numb, like I'm not me anymore.",
+    "I'm furious, nobody ever listens to me.",
+    "I'm okay, just tired.",
+]
+
+
+def run(pipe, texts, repeats):
+    latencies = []
+    for _ in range(repeats):
+        for text in texts:
+            started = time.perf_counter()
+            pipe(text)
+            latencies.append((time.perf_counter() - started) * 1000)
+    results = pipe(texts, batch_size=len(texts))
+    return results, latencies
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("backend", help="backend to check against pytorch")
+    parser.add_argument("--texts", help="file with one text per line (defaults to built-in samples)")
+    parser.add_argument("--repeats", type=int, default=3, help="timing passes over the texts")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="required top-label agreement")
+    parser.add_argument("--max-metric-diff", type=float, default=10.0, help="allowed metric drift in points")
+    args = parser.parse_args()
+
+    texts = SAMPLE_TEXTS
+    if args.texts:
+        with open(args.texts) as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+    report = {}
+    outputs = {}
+    for backend in ("pytorch", args.backend):
+        started = time.perf_counter()
+        pipe = load_pipeline(backend)
+        load_seconds = time.perf_counter() - started
+        outputs[backend], latencies = run(pipe, texts, args.repeats)
+        report[backend] = {
+            "load_s": round(load_seconds, 2),
+            "p50_ms": round(statistics.median(latencies), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+
+    reference, candidate = outputs["pytorch"], outputs[args.backend]
+    agreement = sum(r["label"] == c["label"] for r, c in zip(reference, candidate)) / len(texts)
+    score_diff = max((abs(r["score"] - c["score"]) for r, c in zip(reference, candidate) if r["label"] == c["label"]), default=0.0)
+    metric_diff = max(
+        abs(metrics_from_results(text, [r])[key] - metrics_from_results(text, [c])[key])
+        for text, r, c in zip(texts, reference, candidate)
+        for key in ("self_harm", "homicidal", "distress", "psychosis")
+    )
+
+    for backend, figures in report.items():
+        print(f"{backend:>10}: load {figures['load_s']}s, p50 {figures['p50_ms']} ms, p99 {figures['p99_ms']} ms")
+    print(f"top-label agreement: {agreement:.1%} over {len(texts)} texts")
+    print(f"max score diff (same label): {score_diff:.4f}")
+    print(f"max metric diff: {metric_diff:.2f} points")
+
+    if agreement < args.min_agreement or metric_diff > args.max_metric_diff:
+        print("❌ Parity check failed")
+        sys.exit(1)
+    print("✅ Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import os
+
+from instrumentation import metrics, span
+from phrase_matcher import Lexicon
+
+# Transcript text to risk metrics with an EmotionModel: token windows, one batched model
+# call, label-to-metric mapping and lexicon floors. Used by the sentiment server in-process
+# and by the inference worker processes (inference_pool.py), so it must not import the server.
+
+inference_batch_size = metrics.histogram(
+    "serenity_inference_batch_windows", "Windows per batched model call", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+# Long transcripts are scored as overlapping token windows instead of being truncated by the model.
+# WINDOW_STRIDE is the distance between window starts, so consecutive windows overlap by
+# WINDOW_TOKENS - WINDOW_STRIDE tokens. WINDOW_AGGREGATION is max, mean or recency.
+WINDOW_TOKENS = int(os.getenv("WINDOW_TOKENS", "256"))
+WINDOW_STRIDE = int(os.getenv("WINDOW_STRIDE", "192"))
+WINDOW_AGGREGATION = os.getenv("WINDOW_AGGREGATION", "max")
+RECENCY_DECAY = float(os.getenv("RECENCY_DECAY", "0.8"))
+MAX_INFERENCE_BATCH = int(os.getenv("MAX_INFERENCE_BATCH", "32"))
+METRIC_KEYS = ("self_harm", "homicidal", "distress", "psychosis")
+
+# Weighted risk phrases, edited by the clinical team and picked up without a restart
+lexicon = Lexicon(os.getenv("LEXICON_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "risk_lexicon.json")))
+
+def metrics_from_results(text, results):
+    metrics = {
+        "self_harm": 0,
+        "homicidal": 0,
+        "distress": 0,
+        "psychosis": 0
+    }
+
+    for result in results:
+        label = result['label']
+        score = result['score']
+        if label == 'sadness':
+            metrics["self_harm"] += score
+            metrics["distress"] += score * 0.6
+        elif label in ['anger', 'fear']:
+            metrics["homicidal"] += score
+            metrics["distress"] += score * 0.5
+        elif label == 'joy':
+            metrics["psychosis"] += score * 0.3
+        elif label == 'surprise':
+            metrics["psychosis"] += score * 0.5
+
+    # A lexicon phrase puts a floor of its weight under its metric
+    for hit in lexicon.matcher.find_all(text):
+        if hit.category in metrics:
+            metrics[hit.category] = max(metrics[hit.category], hit.weight)
+
+    for k in metrics:
+        metrics[k] = round(min(metrics[k] * 100, 100), 2)
+
+    return metrics
+
+def split_windows(model, text):
+    """Character spans of overlapping windows of at most WINDOW_TOKENS tokens covering the text."""
+    offsets = model.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    if len(offsets) <= WINDOW_TOKENS:
+        return [(0, len(text))]
+
+    spans = []
+    for start in range(0, len(offsets), WINDOW_STRIDE):
+        end = min(start + WINDOW_TOKENS, len(offsets))
+        spans.append((offsets[start][0], offsets[end - 1][1]))
+        if end == len(offsets):
+            break
+    return spans
+
+def aggregate_windows(windows):
+    if len(windows) == 1:
+        return {k: windows[0][k] for k in METRIC_KEYS}
+
+    if WINDOW_AGGREGATION == "mean":
+        weights = [1.0] * len(windows)
+    elif WINDOW_AGGREGATION == "recency":
+        # Later windows count more: each step back in the call is worth RECENCY_DECAY of the next
+        weights = [RECENCY_DECAY ** (len(windows) - 1 - i) for i in range(len(windows))]
+    else:
+        return {k: max(w[k] for w in windows) for k in METRIC_KEYS}
+
+    total = sum(weights)
+    return {k: round(sum(w[k] * weight for w, weight in zip(windows, weights)) / total, 2) for k in METRIC_KEYS}
+
+def score_batch(model, texts):
+    """Metrics for each text; every window of every text goes through the model in one batched call."""
+    with span("window_split"):
+        spans = [split_windows(model, text) for text in texts]
+    window_texts = [text[start:end] for text, text_spans in zip(texts, spans) for start, end in text_spans]
+    inference_batch_size.observe(len(window_texts))
+    with span("model_inference", backend=model.backend):
+        results = model(window_texts, batch_size=min(len(window_texts), MAX_INFERENCE_BATCH), truncation=True)
+
+    metrics = []
+    position = 0
+    for text, text_spans in zip(texts, spans):
+        windows = []
+        for start, end in text_spans:
+            result = results[position]
+            position += 1
+            window = metrics_from_results(text[start:end], result if isinstance(result, list) else [result])
+            windows.append({"start": start, "end": end, **window})
+
+        # Per-window scores let the dashboard show where in the call the risk peaked
+        combined = aggregate_windows(windows)
+        combined["windows"] = windows
+        metrics.append(combined)
+    return metrics
@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+import time
+
+from transformers import AutoTokenizer, pipeline
+
+from instrumentation import get_logger
+
+log = get_logger("inference")
+
+MODEL_NAME = "bhadresh-savani/distilbert-base-uncased-emotion"
+CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_cache"))
+
+# pytorch:    the original fp32 transformers pipeline
+# torch-int8: same model with its Linear layers dynamically quantized to int8 at load time
+# onnx:       exported once to ONNX and run with ONNX Runtime
+# onnx-int8:  the ONNX export, dynamically quantized to int8 (smallest and fastest on CPU)
+BACKENDS = ("pytorch", "torch-int8", "onnx", "onnx-int8")
+
+WARMUP_TEXTS = [
+    "hi",
+    "I don't know what to do anymore, everything feels like too much.",
+    "I have been hearing voices at night and I can't sleep, they tell me I'm being watched and "
+    "I'm scared to leave my room or talk to anyone about it because they won't believe me.",
+]
+
+
+def _export_dir(backend):
+    return os.path.join(CACHE_DIR, backend)
+
+
+def export_model(backend):
+    """One-time export of the ONNX backends into CACHE_DIR; a no-op if the export is already there."""
+    if backend not in ("onnx", "onnx-int8"):
+        return None
+
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    onnx_dir = _export_dir("onnx")
+    if not os.path.exists(os.path.join(onnx_dir, "model.onnx")):
+        log.info("📦 Exporting %s to ONNX in %s", MODEL_NAME, onnx_dir)
+        model = ORTModelForSequenceClassification.from_pretrained(MODEL_NAME, export=True)
+        model.save_pretrained(onnx_dir)
+        AutoTokenizer.from_pretrained(MODEL_NAME).save_pretrained(onnx_dir)
+
+    if backend == "onnx":
+        return onnx_dir
+
+    int8_dir = _export_dir("onnx-int8")
+    if not os.path.exists(os.path.join(int8_dir, "model_quantized.onnx")):
+        log.info("📦 Quantizing ONNX model to int8 in %s", int8_dir)
+        quantizer = ORTQuantizer.from_pretrained(onnx_dir)
+        config = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=int8_dir, quantization_config=config)
+        AutoTokenizer.from_pretrained(onnx_dir).save_pretrained(int8_dir)
+    return int8_dir
+
+
+def limit_threads(backend, threads):
+    """Cap the intra-op threads of the PyTorch backends (ONNX Runtime gets it per session, see load_pipeline)."""
+    if threads and backend in ("pytorch", "torch-int8"):
+        import torch
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Only settable before the first parallel op; the intra-op cap above is what matters
+            pass
+
+
+def load_pipeline(backend, threads=None):
+    """
+    Build a text-classification pipeline for the emotion model on the given backend.
+    threads caps the threads one inference uses (default: the runtime's own choice, all cores).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+    limit_threads(backend, threads)
+    if backend == "pytorch":
+        return pipeline("text-classification", model=MODEL_NAME)
+
+    if backend == "torch-int8":
+        import torch
+        from transformers import AutoModelForSequenceClassification
+
+        model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return pipeline("text-classification", model=model, tokenizer=AutoTokenizer.from_pretrained(MODEL_NAME))
+
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSequenceClassification
+
+    model_dir = export_model(backend)
+    file_name = "model_quantized.onnx" if backend == "onnx-int8" else "model.onnx"
+    options = onnxruntime.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    model = ORTModelForSequenceClassification.from_pretrained(model_dir, file_name=file_name, session_options=options)
+    return pipeline("text-classification", model=model, tokenizer=AutoTokenizer.from_pretrained(model_dir))
+
+
+class EmotionModel:
+    """
+    The emotion pipeline behind a readiness flag.
+
+    Loading (and exporting, the first time) happens off the main thread, followed by
+    a warm-up pass so the first real request doesn't pay for lazy initialisation.
+    Calls made before the model is ready block until loading finishes.
+    """
+
+    def __init__(self, backend="pytorch", threads=None):
+        self.backend = backend
+        self.threads = threads
+        self.pipeline = None
+        self.ready = threading.Event()
+        self.finished = threading.Event()
+        self.error = None
+        self.load_seconds = None
+        self.warmup_ms = None
+        self._thread = None
+
+    def start_loading(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.load, name="model-loader", daemon=True)
+            self._thread.start()
+
+    def load(self):
+        started = time.perf_counter()
+        try:
+            self.pipeline = load_pipeline(self.backend, self.threads)
+            self.load_seconds = round(time.perf_counter() - started, 2)
+
+            warmup_started = time.perf_counter()
+            self.pipeline(WARMUP_TEXTS, batch_size=len(WARMUP_TEXTS))
+            self.warmup_ms = round((time.perf_counter() - warmup_started) * 1000, 1)
+            self.ready.set()
+        except Exception as e:
+            self.error = str(e)
+            log.error("❌ Failed to load %s emotion model: %s", self.backend, e)
+            return
+        finally:
+            self.finished.set()
+
+        log.info("✅ %s emotion model ready in %ss (warm-up %s ms)", self.backend, self.load_seconds, self.warmup_ms)
+
+    def _wait_until_loaded(self):
+        if not self.ready.is_set():
+            self.start_loading()
+            self.finished.wait()
+            if self.error:
+                raise RuntimeError(f"Emotion model failed to load: {self.error}")
+
+    @property
+    def tokenizer(self):
+        self._wait_until_loaded()
+        return self.pipeline.tokenizer
+
+    def __call__(self, texts, **kwargs):
+        self._wait_until_loaded()
+        return self.pipeline(texts, **kwargs)
+
+    def status(self):
+        return {
+            "status": "ready" if self.ready.is_set() else ("failed" if self.error else "loading"),
+            "backend": self.backend,
+            "threads": self.threads,
+            "load_seconds": self.load_seconds,
+            "warmup_ms": self.warmup_ms,
+            "error": self.error,
+        }
+
+
+if __name__ == "__main__":
+    # Build step, e.g. `python inference_backends.py onnx-int8`, so the server starts from the cache
+    for name in sys.argv[1:] or ["onnx-int8"]:
+        export_model(name)
@@ -0,0 +1,170 @@
+# inference_pool.py - emotion inference sharded over model-owning worker processes
+#
+#   python inference_pool.py --backend onnx-int8 --workers 1 2 4 --texts 512
+#
+# Run directly it measures scoring throughput at each worker count, to check that it
+# scales with cores on the box. The server uses InferencePool when INFERENCE_WORKERS is set.
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from emotion_scoring import score_batch
+from instrumentation import get_logger
+
+log = get_logger("inference_pool")
+
+# The worker process's own copy of the model, set up by _init_worker, or why it has none
+_model = None
+_error = None
+
+
+def _init_worker(backend, threads, ready, failed):
+    global _model, _error
+    try:
+        from inference_backends import EmotionModel
+        _model = EmotionModel(backend, threads)
+        _model.load()
+        _error = _model.error
+    except Exception as e:
+        # Raising here would break the whole pool; the worker stays up and fails its batches instead
+        _error = str(e)
+    counter = failed if _error else ready
+    with counter.get_lock():
+        counter.value += 1
+
+
+def _started():
+    return os.getpid()
+
+
+def _score_batch(texts):
+    if _error:
+        raise RuntimeError(f"Emotion model failed to load: {_error}")
+    return score_batch(_model, texts)
+
+
+class InferencePool:
+    """
+    Emotion inference in worker processes, each loading its own copy of the model.
+
+    Batches go through the executor's shared call queue to whichever worker is free,
+    so N workers with threads_per_worker threads each keep N x threads_per_worker
+    cores busy and none of the model work runs on the server's event loop or holds
+    its GIL. Workers are spawned rather than forked, so they never inherit the
+    server's threads; a worker that dies is replaced on the next request.
+    """
+
+    def __init__(self, backend, workers, threads_per_worker=None):
+        self.backend = backend
+        self.workers = max(1, int(workers))
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self._context = multiprocessing.get_context("spawn")
+        self._ready = self._context.Value("i", 0)
+        self._failed = self._context.Value("i", 0)
+        self._pool = None
+
+    def start(self):
+        if self._pool is not None:
+            return
+        # Fresh counters, so workers of a pool being shut down can't count towards this one
+        self._ready = self._context.Value("i", 0)
+        self._failed = self._context.Value("i", 0)
+        # Native libraries read these once, as a worker imports them, so they have to be in the
+        # environment workers are spawned with (this process's, which doesn't run the model).
+        # The backends are capped explicitly as well (inference_backends.load_pipeline).
+        for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[name] = str(self.threads_per_worker)
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=(self.backend, self.threads_per_worker, self._ready, self._failed),
+        )
+        # Start every worker now so the models load side by side at boot, not on first request
+        for _ in range(self.workers):
+            self._pool.submit(_started)
+        log.info("🧵 Starting %d inference workers with %d threads each", self.workers, self.threads_per_worker)
+
+    async def score_batch(self, texts):
+        """Metrics for each text, computed in a worker; awaiting it never blocks the loop."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._pool, _score_batch, texts)
+        except BrokenProcessPool:
+            log.error("❌ An inference worker died, restarting the pool")
+            self.shutdown()
+            raise
+
+    def ready(self):
+        return self._ready.value > 0
+
+    def status(self):
+        ready, failed = self._ready.value, self._failed.value
+        return {
+            "status": "ready" if ready else ("failed" if failed >= self.workers else "loading"),
+            "backend": self.backend,
+            "workers": self.workers,
+            "workers_ready": ready,
+            "workers_failed": failed,
+            "threads_per_worker": self.threads_per_worker,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+async def measure(pool, texts, batch_size):
+    """Texts per second with batches of batch_size kept in flight on every worker."""
+    while True:
+        status = pool.status()
+        if status["workers_ready"] + status["workers_failed"] >= pool.workers:
+            break
+        await asyncio.sleep(0.5)
+    if status["workers_failed"]:
+        raise RuntimeError(f"{status['workers_failed']} inference workers failed to load")
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    # One warm-up round so every worker has run once
+    await asyncio.gather(*(pool.score_batch(batches[0]) for _ in range(pool.workers)))
+    started = time.perf_counter()
+    await asyncio.gather(*(pool.score_batch(batch) for batch in batches))
+    return len(texts) / (time.perf_counter() - started)
+
+
+async def benchmark(args):
+    sample = [
+        "I don't know what to do anymore, everything feels like too much.",
+        "I'm so angry at him, I could hurt someone.",
+        "I hear voices telling me I'm not real and I'm scared to leave my room.",
+        "Thanks for listening, I feel a bit better now.",
+    ]
+    texts = [sample[i % len(sample)] + f" ({i})" for i in range(args.texts)]
+    baseline = None
+    for workers in args.workers:
+        pool = InferencePool(args.backend, workers, args.threads)
+        pool.start()
+        try:
+            rate = await measure(pool, texts, args.batch_size)
+        finally:
+            pool.shutdown()
+        baseline = baseline or rate / workers
+        print(f"{workers:>3} workers x {pool.threads_per_worker} threads: {rate:8.1f} texts/s "
+              f"({rate / baseline:.2f}x one worker)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default=os.getenv("INFERENCE_BACKEND", "onnx-int8"))
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to compare")
+    parser.add_argument("--threads", type=int, default=1, help="threads per worker (0: cores / workers)")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=16)
+    asyncio.run(benchmark(parser.parse_args()))
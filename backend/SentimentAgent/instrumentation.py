@@ -0,0 +1,271 @@
+import atexit
+import bisect
+import inspect
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from functools import wraps
+
+# Seconds; covers sub-millisecond dict work up to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """A total that only goes up; with fn it is read from fn() at scrape time, for totals kept elsewhere."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                return [(self.name, (), self.fn())]
+            except Exception:
+                return []
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge:
+    """A value that goes up and down; with fn it is read from fn() at scrape time and costs nothing in between."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                return [(self.name, (), self.fn())]
+            except Exception:
+                return []
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        result = []
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                result.append((self.name + "_bucket", key + (("le", repr(float(bound))),), cumulative))
+            result.append((self.name + "_bucket", key + (("le", "+Inf"),), count))
+            result.append((self.name + "_sum", key, total))
+            result.append((self.name + "_count", key, count))
+        return result
+
+
+class Registry:
+    """Process-wide metrics, rendered in the Prometheus text format for /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            return metric
+
+    def counter(self, name, help="", fn=None):
+        counter = self._get_or_create(Counter, name, help)
+        if fn is not None:
+            counter.fn = fn
+        return counter
+
+    def gauge(self, name, help="", fn=None):
+        gauge = self._get_or_create(Gauge, name, help)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help, buckets=buckets)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                # le is appended last for buckets, so it is split off the sorted labels here
+                extra = [pair for pair in key if pair[0] == "le"]
+                base = tuple(pair for pair in key if pair[0] != "le")
+                lines.append(f"{name}{_format_labels(base, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+metrics = Registry()
+
+span_seconds = metrics.histogram("serenity_span_seconds", "Time spent in instrumented sections of the call pipeline")
+
+
+class span:
+    """
+    Times a block into serenity_span_seconds{span=name}:
+
+        with span("dedupe"):
+            ...
+
+    Also usable as a decorator on plain and async functions.
+    """
+
+    __slots__ = ("name", "labels", "_started")
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        span_seconds.observe(time.perf_counter() - self._started, span=self.name, **self.labels)
+        return False
+
+    def __call__(self, func):
+        name, labels = self.name, self.labels
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def timed_async(*args, **kwargs):
+                with span(name, **labels):
+                    return await func(*args, **kwargs)
+            return timed_async
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            with span(name, **labels):
+                return func(*args, **kwargs)
+        return timed
+
+
+# Logging: records are handed to a queue on the calling thread and written by a background
+# listener, so a log call costs a queue put instead of a stdout write. LOG_LEVEL sets the
+# level; LOG_SAMPLE_RATE keeps that fraction of DEBUG/INFO records (warnings and errors
+# are always kept). Messages should describe events, not carry transcript text.
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+_listener = None
+_setup_lock = threading.Lock()
+log_records = metrics.counter("serenity_log_records_total", "Log records emitted, by level")
+
+
+class _CountingHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        log_records.inc(level=record.levelname.lower())
+        super().enqueue(record)
+
+
+def setup_logging():
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        log_queue = queue.SimpleQueue()
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        _listener = logging.handlers.QueueListener(log_queue, stream)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+        handler = _CountingHandler(log_queue)
+        handler.addFilter(SamplingFilter(float(os.getenv("LOG_SAMPLE_RATE", "1.0"))))
+        root = logging.getLogger("serenity")
+        root.addHandler(handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.propagate = False
+
+        # The development server's per-request access log goes through the same queue and sampling
+        access = logging.getLogger("werkzeug")
+        access.addHandler(handler)
+        access.propagate = False
+
+
+def get_logger(name):
+    setup_logging()
+    return logging.getLogger(f"serenity.{name}")
@@ -0,0 +1,19 @@
+# main.py - starts the sentiment service: the HTTP API and the uAgent (analyze_emotions.py)
+#
+#   python3 main.py
+#
+# Inference and audio workers are spawned processes, and a spawned process imports the
+# parent's main module again (as __mp_main__). Starting from this module keeps that
+# import trivial: the app, the agent, the model and the worker pools are only built
+# in the server process, not once more in every worker.
+
+if __name__ == "__main__":
+    import uvicorn
+    from uagents import Bureau
+
+    from analyze_emotions import agent, app
+
+    bureau = Bureau()
+    bureau.add(agent)
+    bureau.run_in_thread()
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,180 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+try:
+    from instrumentation import get_logger
+except ImportError:
+    # Imported as SentimentAgent.phrase_matcher by the webhook server in backend/
+    from SentimentAgent.instrumentation import get_logger
+
+log = get_logger("lexicon")
+
+Hit = namedtuple("Hit", "start end phrase category weight")
+
+# A name right after a name cue, e.g. "my name is Sam" / "nice to meet you, Sam"
+NAME_AFTER_CUE = re.compile(r",?\s+([A-Z][a-z]+)", re.IGNORECASE)
+
+
+def normalize_phrase(text):
+    return " ".join(text.replace("’", "'").lower().split())
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+def _trie_pattern(node):
+    """Regex for a character trie; shared prefixes are matched once instead of once per phrase."""
+    branches = []
+    for char, child in sorted(node.items()):
+        if char == "":
+            continue
+        token = r"\s+" if char == " " else re.escape(char)
+        branches.append(token + _trie_pattern(child))
+
+    # A phrase ends here on a word boundary, or anywhere in the word for a prefix phrase
+    end = None
+    if "" in node:
+        end = "" if node[""]["prefix"] else r"(?!\w)"
+    if not branches:
+        return end or ""
+    if end is not None:
+        branches.append(end)
+    elif len(branches) == 1:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")"
+
+
+class PhraseMatcher:
+    """
+    Finds every lexicon phrase in a text, overlapping ones included.
+
+    The phrases are merged into one trie-shaped regex, so finding the positions where
+    any phrase starts costs one pass over the text whatever the number of phrases;
+    the trie is then walked from each of those to collect every phrase ending there
+    ("kill" and "kill myself", "not real" inside "i'm not real"). Matching is
+    case-insensitive, on whole words, treats any run of whitespace as a space and
+    curly apostrophes as straight ones. An entry with "prefix": true also matches
+    when its last word goes on ("overdos" in "overdosed"); the hit then covers the
+    whole word. Hits are ordered by start, longest first.
+
+    not_names are words that follow a name cue without being a name ("i am feeling").
+    """
+
+    def __init__(self, entries, not_names=()):
+        self.entries = {}
+        self.trie = trie = {}
+        self.not_names = {name.lower() for name in not_names}
+        for entry in entries:
+            phrase = normalize_phrase(entry["phrase"])
+            if not phrase:
+                continue
+            self.entries.setdefault(phrase, []).append(entry)
+            node = trie
+            for char in phrase:
+                node = node.setdefault(char, {})
+            end = node.setdefault("", {"prefix": False})
+            end["prefix"] = end["prefix"] or bool(entry.get("prefix"))
+
+        body = _trie_pattern(trie) if trie else "(?!)"
+        # Zero-width, so a match never consumes text another phrase could start in
+        self.pattern = re.compile(r"(?<!\w)(?=" + body + ")", re.IGNORECASE)
+
+    def _ends(self, text, start):
+        """(end, phrase, whole_word) of every phrase starting at start, shortest first."""
+        node = self.trie
+        chars = []
+        i, size = start, len(text)
+        while i < size:
+            if text[i].isspace():
+                key = " "
+                while i < size and text[i].isspace():
+                    i += 1
+            else:
+                key = text[i].lower()
+                i += 1
+            node = node.get(key)
+            if node is None:
+                break
+            chars.append(key)
+            if "" in node:
+                if i == size or not _is_word_char(text[i]):
+                    yield i, "".join(chars), True
+                elif node[""]["prefix"]:
+                    end = i
+                    while end < size and _is_word_char(text[end]):
+                        end += 1
+                    yield end, "".join(chars), False
+
+    def find_all(self, text):
+        text = text.replace("’", "'")
+        hits = []
+        for match in self.pattern.finditer(text):
+            start = match.start()
+            for end, phrase, whole_word in reversed(list(self._ends(text, start))):
+                for entry in self.entries.get(phrase, ()):
+                    if not whole_word and not entry.get("prefix"):
+                        continue
+                    hits.append(Hit(start, end, phrase, entry["category"], entry.get("weight", 1.0)))
+        return hits
+
+    def extract_name(self, text, role):
+        """The name following the first name cue for this role ("name_cue:user" / "name_cue:bot"), if any."""
+        category = f"name_cue:{role}"
+        text = text.replace("’", "'")
+        longest = {}
+        for hit in self.find_all(text):
+            # A cue that is only the start of a longer phrase ("i'm" in "i'm not me") is not one
+            longest.setdefault(hit.start, hit.end)
+            if hit.category == category and hit.end == longest[hit.start]:
+                match = NAME_AFTER_CUE.match(text, hit.end)
+                if match and match.group(1).lower() not in self.not_names:
+                    return match.group(1).capitalize()
+        return None
+
+
+class Lexicon:
+    """
+    A PhraseMatcher built from a JSON lexicon file and rebuilt when the file changes.
+
+    The file is a list of {"phrase", "category", "weight"} objects under "phrases"
+    (optionally "prefix": true) and the words that are never names under "not_names".
+    Its modification time is checked at most every check_interval seconds; a broken
+    edit is reported and the previous matcher stays in use.
+    """
+
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._mtime = None
+        self._checked_at = 0.0
+        self._matcher = PhraseMatcher([])
+        self._lock = threading.Lock()
+        self._reload(force=True)
+
+    @property
+    def matcher(self):
+        if time.time() - self._checked_at >= self.check_interval:
+            self._reload()
+        return self._matcher
+
+    def _reload(self, force=False):
+        with self._lock:
+            self._checked_at = time.time()
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if mtime == self._mtime and not force:
+                    return
+                with open(self.path, encoding="utf-8") as f:
+                    data = json.load(f)
+                matcher = PhraseMatcher(data["phrases"], data.get("not_names", ()))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                log.error("❌ Failed to load lexicon %s: %s", self.path, e)
+                return
+            self._mtime = mtime
+            self._matcher = matcher
+            log.info("📚 Loaded %d lexicon phrases from %s", len(matcher.entries), self.path)
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def text_key(text):
+    """Cache key for a text: case and whitespace differences don't change the model's answer."""
+    normalized = " ".join((text or "").replace("’", "'").lower().split())
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of analysis results with a time-to-live, keyed by normalized text.
+
+    get_or_compute also coalesces in-flight work: while a text is being analyzed,
+    identical requests wait for that result instead of starting their own. A compute
+    that returns None (a failed call) is not cached. Results are shared between
+    callers, so they must not be mutated.
+    """
+
+    def __init__(self, max_entries=2048, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._compute_seconds = 0.0
+        self._computed = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, text):
+        """The cached result for text, or None; counts a hit or a miss."""
+        key = text_key(text)
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, text, value):
+        if value is not None:
+            with self._lock:
+                self._store(text_key(text), value)
+
+    async def get_or_compute(self, text, compute):
+        """The cached result for text, else the result of `await compute(text)`, shared with concurrent callers."""
+        key = text_key(text)
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            task = self._inflight.get(key)
+            if task is not None:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                task = asyncio.ensure_future(self._compute(key, text, compute))
+                self._inflight[key] = task
+        # shield: one caller giving up must not cancel the work the others are waiting for
+        return await asyncio.shield(task)
+
+    async def _compute(self, key, text, compute):
+        started = time.perf_counter()
+        value = None
+        try:
+            value = await compute(text)
+            return value
+        finally:
+            # Cache and leave the in-flight table in one step so no request can slip in between
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._compute_seconds += time.perf_counter() - started
+                self._computed += 1
+                if value is not None:
+                    self._store(key, value)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            mean_compute_ms = self._compute_seconds * 1000 / self._computed if self._computed else 0.0
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+                "mean_compute_ms": round(mean_compute_ms, 2),
+                # Work the cache avoided, at the average cost of the computes it did run
+                "saved_ms": round((self.hits + self.coalesced) * mean_compute_ms, 1)
+            }
@@ -1,7 +1,7 @@
 # send_request.py
 import requests
 
-url = "http://localhost:8000/analyze"
+url = "http://localhost:8000/"
 text_to_analyze = "I hear voices and I feel like I'm not myself."
 
 response = requests.post(url, json={"text": text_to_analyze})
@@ -1,2 +1,2 @@
 #!/bin/bash
-python3 analyze_emotions.py
+python3 main.py
@@ -1,82 +1,309 @@
-from flask import Flask, request, jsonify
-from flask_socketio import SocketIO, emit
-import requests
-import json
+from flask import Flask, Response, request, jsonify
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from dataclasses import asdict
 from datetime import datetime
+import os
+import threading
+import time
+
+from async_runtime import runtime
+from backpressure import BroadcastQueue, pipeline_status, register_source
+from broadcaster import LOBBY_ROOM, CallBroadcaster, agent_room, call_room
+from call_model import CallData, Utterance
+from call_store import CallStore
+from SentimentAgent.instrumentation import PROMETHEUS_CONTENT_TYPE, get_logger, metrics, span
+from event_bus import (
+    EVENT_TYPES, CallReport, LiveTranscriptUpdate, NewCall, RiskAssessmentUpdate, bus, event_from_dict
+)
+from sentiment_client import result_cache
+from serialization import FastJSONProvider, socketio_options
+from triage import TriageQueue
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key'
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-# Global call counter
-call_counter = 1000
-
-class CallData:
-    def __init__(self, user_phone, user_name, call_duration, call_transcript, summary):
-        self.id = 0
-        self.user_phone = user_phone
-        self.user_name = user_name
-        self.call_duration = call_duration
-        self.self_harm_percentage = -1
-        self.homicidal_percentage = -1
-        self.psychosis_percentage = -1
-        self.distress_percentage = -1
-        self.call_priority = "Analyzing"
-        self.call_transcript = call_transcript
-        self.summary = summary
-    
-    def update_status_percentages(self):
-        if self.call_transcript is None:
+app.json = FastJSONProvider(app)
+# With SOCKETIO_MESSAGE_QUEUE (e.g. redis://...) several server processes share the same clients.
+# SOCKETIO_SERIALIZER=msgpack switches payloads to binary MessagePack frames (clients need the msgpack parser).
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE"),
+    **socketio_options(os.getenv("SOCKETIO_SERIALIZER", "json"))
+)
+broadcaster = CallBroadcaster(socketio)
+
+# Dashboard updates leave through a bounded queue, coalesced per call, with an urgent lane
+# for final reports and high-risk changes; its saturation is reported to the lobby
+broadcast_queue = BroadcastQueue(
+    broadcaster,
+    max_pending=int(os.getenv("BROADCAST_MAX_PENDING", "500")),
+    on_status=lambda status: socketio.emit('pipeline_status', status, to=LOBBY_ROOM)
+)
+register_source("broadcast", broadcast_queue.status)
+
+# Completed and live calls, persisted for history and reconnecting dashboards
+call_store = CallStore(os.getenv("CALL_STORE_PATH", "calls.db"))
+
+# Global call counter, continuing after the ids already in the call store; webhook
+# requests and bus handlers run on several threads, so ids are taken under the lock
+call_counter = max(1000, call_store.max_call_id() or 0)
+call_counter_lock = threading.Lock()
+
+# Vapi call id -> CallData for calls still in progress
+active_calls = {}
+
+# Vapi call id -> time of the call's last event; calls that never send their end-of-call
+# report are dropped from the dashboard and the triage queue after CALL_IDLE_TIMEOUT seconds
+last_activity = {}
+CALL_IDLE_TIMEOUT = float(os.getenv("CALL_IDLE_TIMEOUT", "900"))
+CALL_SWEEP_INTERVAL = float(os.getenv("CALL_SWEEP_INTERVAL", "30"))
+
+# In-progress calls waiting for a human agent, highest risk / longest wait first
+triage_queue = TriageQueue(wait_weight=float(os.getenv("TRIAGE_WAIT_WEIGHT", "0.1")))
+QUEUE_BROADCAST_SIZE = int(os.getenv("QUEUE_BROADCAST_SIZE", "20"))
+# Score updates of calls at or above this composite risk (0-100) take the broadcast queue's urgent lane
+URGENT_RISK = float(os.getenv("BROADCAST_URGENT_RISK", "80"))
+last_queue_order = []
+queue_lock = threading.Lock()
+
+log = get_logger("dashboard")
+metrics.gauge("serenity_active_calls", "In-progress calls on the dashboard", fn=lambda: len(active_calls))
+metrics.gauge("serenity_triage_queue_depth", "Calls waiting for a human agent", fn=lambda: len(triage_queue))
+metrics.gauge("serenity_call_store_pending_writes", "Call store writes not yet committed", fn=lambda: call_store.pending())
+metrics.gauge("serenity_async_runtime_pending", "Coroutines queued on the async runtime", fn=lambda: runtime.pending)
+metrics.gauge("serenity_broadcast_pending", "Calls with a dashboard update waiting to be sent", fn=broadcast_queue.pending)
+metrics.counter("serenity_broadcast_overflowed_total", "Updates recorded without an emit because the queue was full", fn=lambda: broadcast_queue.overflowed)
+
+
+def publish_call(call_data):
+    """Create a dashboard call from a call payload, broadcast it and start its analysis."""
+    global call_counter
+
+    new_call = CallData(
+        user_phone=call_data.get("user_phone"),
+        user_name=call_data.get("user_name"),
+        call_duration=call_data.get("call_duration"),
+        call_transcript=call_data.get("call_transcript"),
+        summary=call_data.get("summary")
+    )
+    new_call.recording_url = call_data.get("recording_url")
+
+    vapi_call_id = call_data.get("call_id")
+    in_progress = call_data.get("status") == "in-progress"
+    new_call.status = "in-progress" if in_progress else "completed"
+
+    # A final report completes the call the dashboard has been following live
+    finished = active_calls.pop(vapi_call_id, None) if vapi_call_id and not in_progress else None
+    last_activity.pop(vapi_call_id, None)
+    if finished is not None:
+        new_call.id = finished.id
+        new_call.self_harm_percentage = finished.self_harm_percentage
+        new_call.homicidal_percentage = finished.homicidal_percentage
+        new_call.psychosis_percentage = finished.psychosis_percentage
+        new_call.distress_percentage = finished.distress_percentage
+        new_call.call_priority = finished.call_priority
+        triage_queue.remove(finished.id)
+        publish_queue_positions()
+    else:
+        with call_counter_lock:
+            call_counter += 1
+            new_call.id = call_counter
+
+    risk_scores = call_data.get("risk_scores")
+    # In-progress calls are scored utterance by utterance through risk_assessment_update;
+    # a finished call is analyzed once more if live scoring missed utterances or it has a recording
+    needs_analysis = not in_progress and (
+        not risk_scores or call_data.get("scores_incomplete") or new_call.recording_url
+    )
+    if risk_scores:
+        # Scores were accumulated live during the call, no need to re-analyze the transcript
+        new_call.apply_sentiment(risk_scores)
+        new_call.update_call_priority()
+
+    if vapi_call_id and in_progress:
+        active_calls[vapi_call_id] = new_call
+        last_activity[vapi_call_id] = time.time()
+
+    log.info("📞 Call %s (%s) is %s, priority %s", new_call.id, vapi_call_id, new_call.status, new_call.call_priority)
+
+    # Announce the call once in full, later changes go out as deltas
+    if finished is not None:
+        broadcast_queue.submit(new_call.id, new_call.to_dict(), urgent=True)
+    else:
+        broadcaster.open_call(new_call.id, new_call.to_dict())
+    call_store.save_call(new_call, vapi_call_id)
+
+    if in_progress:
+        triage_queue.add(new_call.id, new_call.composite_risk(), item=new_call)
+        publish_queue_positions()
+
+    # Acknowledge right away, the scores follow as a call_delta
+    if needs_analysis:
+        runtime.submit(analyze_call(new_call))
+    elif not in_progress:
+        broadcast_queue.close(new_call.id)
+
+    return new_call
+
+
+async def analyze_call(call):
+    if await call.update_status_percentages() is not None:
+        call.update_call_priority()
+        log.info("🧠 Call %s analyzed, priority %s", call.id, call.call_priority)
+        emit_risk_assessment(call)
+    broadcast_queue.close(call.id)
+
+
+def emit_risk_assessment(call):
+    # Superseded scores of a normal-priority call may be coalesced away; high-risk ones jump the queue
+    broadcast_queue.submit(call.id, {
+        "self_harm_percentage": call.self_harm_percentage,
+        "homicidal_percentage": call.homicidal_percentage,
+        "psychosis_percentage": call.psychosis_percentage,
+        "distress_percentage": call.distress_percentage,
+        "call_priority": call.call_priority,
+        "risk_windows": call.risk_windows,
+        "audio_features": call.audio_features
+    }, urgent=call.composite_risk() >= URGENT_RISK)
+    call_store.save_call(call)
+    call_store.add_risk_score(call.id, call)
+
+    if call.id in triage_queue:
+        triage_queue.update(call.id, call.composite_risk())
+        publish_queue_positions()
+
+
+def publish_queue_positions():
+    """Tell dashboards about the head of the triage queue whenever its order changes."""
+    global last_queue_order
+
+    top = triage_queue.top_k(QUEUE_BROADCAST_SIZE)
+    order = [entry["call_id"] for entry in top]
+    with queue_lock:
+        if order == last_queue_order:
             return
+        last_queue_order = order
+
+    with span("socketio_emit", event="queue_update"):
+        socketio.emit('queue_update', queue_update_json(top), to=LOBBY_ROOM)
 
-        # Make call to backend huggingface model
-        url = "https://roshansanjeev-sentimentanalysis.hf.space/"
-        payload = {"text": self.call_transcript}
 
+def queue_update_json(top):
+    return {
+        "queue_size": len(triage_queue),
+        "positions": [
+            {"call_id": entry["call_id"], "position": position, "risk": round(entry["risk"], 1)}
+            for position, entry in enumerate(top, start=1)
+        ]
+    }
+
+
+def expire_idle_calls(now=None):
+    """Close the in-progress calls that have had no event for CALL_IDLE_TIMEOUT seconds."""
+    now = time.time() if now is None else now
+    expired = []
+    for vapi_call_id, seen in list(last_activity.items()):
+        if now - seen < CALL_IDLE_TIMEOUT:
+            continue
+        last_activity.pop(vapi_call_id, None)
+        # A final report arriving at the same time wins the pop, the call is not expired twice
+        call = active_calls.pop(vapi_call_id, None)
+        if call is None:
+            continue
+        call.status = "timed-out"
+        triage_queue.remove(call.id)
+        broadcast_queue.submit(call.id, {"status": call.status}, urgent=True)
+        broadcast_queue.close(call.id)
+        call_store.save_call(call, vapi_call_id)
+        expired.append(call)
+
+    if expired:
+        log.warning("⏰ Expired %d idle calls: %s", len(expired), [call.id for call in expired])
+        publish_queue_positions()
+    return expired
+
+
+def sweep_idle_calls():
+    while True:
+        socketio.sleep(CALL_SWEEP_INTERVAL)
         try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            sentiment_analysis = response.json()
-            print("Response:", sentiment_analysis)
-        except requests.exceptions.RequestException as e:
-            print(f"Error calling sentiment analysis API: {e}")
-            return
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON. Response: {response.text}")
-            return
+            expire_idle_calls()
+        except Exception as e:
+            log.exception("❌ Failed to expire idle calls: %s", e)
+
+
+socketio.start_background_task(sweep_idle_calls)
+
+
+def queue_entry_json(entry, position=None):
+    now = time.time()
+    return {
+        "position": position,
+        "risk": round(entry["risk"], 1),
+        "waited_seconds": round(now - entry["enqueued_at"], 1),
+        "call": entry["item"].to_dict()
+    }
+
+
+# Event bus subscribers: everything that reaches the dashboard goes through these
 
-        def _normalize_score(score):
-            """Normalize score to 99 if it's 1 or True, and 0.0 if None."""
-            if score is True or score == 1:
-                return 99
-            if score is None:
-                return 0
-            else:
-                return int(score * 100)
-
-        self.self_harm_percentage = _normalize_score(sentiment_analysis.get("self_harm"))
-        self.homicidal_percentage = _normalize_score(sentiment_analysis.get("homicidal"))
-        self.psychosis_percentage = _normalize_score(sentiment_analysis.get("psychosis"))
-        self.distress_percentage = _normalize_score(sentiment_analysis.get("distress"))
-
-        return sentiment_analysis
-    
-    def update_call_priority(self):
-        if (self.homicidal_percentage is not None and self.homicidal_percentage > 80.0) or \
-           (self.psychosis_percentage is not None and self.psychosis_percentage > 80.0) or \
-           (self.self_harm_percentage is not None and self.self_harm_percentage > 80.0) or \
-           (self.distress_percentage is not None and self.distress_percentage > 80.0):
-            self.call_priority = "High Priority"
-        else:
-            self.call_priority = "Normal" 
-        
-        return self.call_priority
+def on_new_call(event):
+    if event.call_id in active_calls:
+        # A relay retry after a post that arrived but whose response was lost
+        log.info("🔁 Call %s is already on the dashboard", event.call_id)
+        return
+    publish_call({
+        "call_id": event.call_id,
+        "status": "in-progress",
+        "user_phone": event.user_phone,
+        "user_name": event.user_name,
+        "call_duration": "0.0",
+        "call_transcript": "",
+        "summary": "Call in progress..."
+    })
+
+
+def on_live_transcript_update(event):
+    call = active_calls.get(event.call_id)
+    if call is None:
+        log.warning("⚠️ Transcript update for unknown call %s", event.call_id)
+        return
+    last_activity[event.call_id] = time.time()
+
+    call.user_name = event.user_name
+    call_store.add_message(call.id, event.role, event.message, event.timestamp)
+    broadcast_queue.submit(
+        call.id,
+        {"user_name": event.user_name},
+        chunk=Utterance(event.role, event.message, event.timestamp)
+    )
+
+
+def on_risk_assessment_update(event):
+    call = active_calls.get(event.call_id)
+    if call is None:
+        log.warning("⚠️ Risk update for unknown call %s", event.call_id)
+        return
+    last_activity[event.call_id] = time.time()
+
+    call.apply_sentiment(event.scores)
+    call.update_call_priority()
+    emit_risk_assessment(call)
+
+
+def on_call_report(event):
+    publish_call(asdict(event))
+
+
+bus.subscribe(NewCall, on_new_call)
+bus.subscribe(LiveTranscriptUpdate, on_live_transcript_update)
+bus.subscribe(RiskAssessmentUpdate, on_risk_assessment_update)
+bus.subscribe(CallReport, on_call_report)
 
 
 @app.route('/vapi-webhook', methods=['POST'])
 def handle_webhook():
     data = request.json
-    global call_counter
 
     if data is None:
         return '', 204
@@ -86,25 +313,19 @@ def handle_webhook():
     else:
         call_data = data
 
-    call_counter += 1
-    new_call = CallData(
-        user_phone=call_data.get("user_phone"),
-        user_name=call_data.get("user_name"),
-        call_duration=call_data.get("call_duration"),
-        call_transcript=call_data.get("call_transcript"),
-        summary=call_data.get("summary")
-    )
-    new_call.id = call_counter
-    new_call.update_status_percentages()
-    new_call.update_call_priority()
-    print("--------------------------------")
-    print("Priority:", new_call.call_priority)
+    new_call = publish_call(call_data)
+    return jsonify(new_call.to_dict()), 200
 
-    # Broadcast full report to frontend
-    socketio.emit('new_call', new_call.__dict__)
-    print("✅ WebSocket emission: new_call")
 
-    return jsonify(new_call.__dict__), 200
+# Events published by a relay running in another process (HttpTransport)
+@app.route('/events', methods=['POST'])
+def handle_event():
+    data = request.json
+    if not data or data.get("type") not in EVENT_TYPES:
+        return jsonify({"error": "Unknown event"}), 400
+
+    bus.dispatch(event_from_dict(data))
+    return jsonify({"status": "ok"}), 200
 
 
 # ✅ NEW: Real-time transcript message endpoint
@@ -114,10 +335,140 @@ def handle_live_update():
     if not data:
         return jsonify({"error": "No data provided"}), 400
 
-    print(f"🟢 Live message received: {data}")
-    socketio.emit('live_transcript_update', data)
+    bus.dispatch(LiveTranscriptUpdate(
+        call_id=data.get("call_id"),
+        user_phone=data.get("user_phone"),
+        user_name=data.get("user_name"),
+        role=data.get("role"),
+        message=data.get("message"),
+        timestamp=data.get("timestamp")
+    ))
     return jsonify({"status": "ok"}), 200
 
 
+# Triage: hand the next caller to an available human agent
+@app.route('/triage/next', methods=['POST'])
+def handle_triage_next():
+    data = request.json or {}
+    agent_id = data.get("agent_id")
+    if not agent_id:
+        return jsonify({"error": "agent_id is required"}), 400
+
+    entry = triage_queue.pop_next()
+    if entry is None:
+        return '', 204
+
+    call = entry["item"]
+    call.status = "connected-to-agent"
+    broadcaster.assign(call.id, agent_id)
+    broadcast_queue.submit(call.id, {"status": call.status, "agent_id": agent_id}, urgent=True)
+    call_store.save_call(call)
+    publish_queue_positions()
+    return jsonify(queue_entry_json(entry)), 200
+
+
+@app.route('/triage/queue', methods=['GET'])
+def handle_triage_queue():
+    k = request.args.get("k", default=10, type=int)
+    return jsonify({
+        "queue_size": len(triage_queue),
+        "calls": [queue_entry_json(entry, position) for position, entry in enumerate(triage_queue.top_k(k), start=1)]
+    }), 200
+
+
+# Call history: paginated, filterable list of stored calls
+@app.route('/calls', methods=['GET'])
+def handle_list_calls():
+    args = request.args
+    return jsonify(call_store.list_calls(
+        page=args.get("page", default=1, type=int),
+        page_size=args.get("page_size", default=50, type=int),
+        phone=args.get("phone"),
+        priority=args.get("priority"),
+        status=args.get("status"),
+        since=args.get("since", type=float),
+        until=args.get("until", type=float),
+        min_risk=args.get("min_risk", type=float)
+    )), 200
+
+
+@app.route('/calls/<int:call_id>', methods=['GET'])
+def handle_get_call(call_id):
+    call = call_store.get_call(call_id)
+    if call is None:
+        return jsonify({"error": "Unknown call"}), 404
+    return jsonify(call), 200
+
+
+# Queue saturation of every stage running in this process (also pushed to the lobby as pipeline_status)
+@app.route('/pipeline-status', methods=['GET'])
+def handle_pipeline_status():
+    return jsonify(pipeline_status()), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def handle_metrics():
+    return Response(metrics.render(), mimetype=PROMETHEUS_CONTENT_TYPE)
+
+
+# How many sentiment service round trips the client-side result cache saved
+@app.route('/sentiment-cache-stats', methods=['GET'])
+def handle_sentiment_cache_stats():
+    return jsonify(result_cache.stats()), 200
+
+
+# Everything a (re)connecting dashboard needs in one response
+@app.route('/calls/snapshot', methods=['GET'])
+def handle_snapshot():
+    limit = request.args.get("recent", default=50, type=int)
+    live = []
+    for call in list(active_calls.values()):
+        _, snapshot = broadcaster.catch_up(call.id, None)
+        if snapshot is not None:
+            live.append(snapshot)
+
+    live_ids = {snapshot["call_id"] for snapshot in live}
+    recent = [c for c in call_store.list_calls(page_size=limit)["calls"] if c["id"] not in live_ids]
+    return jsonify({"live": live, "recent": recent}), 200
+
+
+# Dashboard subscriptions: lobby on connect, per-call and per-agent rooms on request
+
+@socketio.on('connect')
+def handle_connect():
+    join_room(LOBBY_ROOM)
+    # queue_update is only sent when the order changes, so a new dashboard gets the current one
+    emit('queue_update', queue_update_json(triage_queue.top_k(QUEUE_BROADCAST_SIZE)))
+
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Join a call's room and catch up from the client's last seen seq (or get a snapshot)."""
+    call_id = (data or {}).get("call_id")
+    if call_id is None:
+        return
+
+    join_room(call_room(call_id))
+    deltas, snapshot = broadcaster.catch_up(call_id, data.get("since_seq"))
+    if snapshot is not None:
+        emit('call_snapshot', snapshot)
+    for delta in deltas or []:
+        emit('call_delta', delta)
+
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    call_id = (data or {}).get("call_id")
+    if call_id is not None:
+        leave_room(call_room(call_id))
+
+
+@socketio.on('join_agent')
+def handle_join_agent(data):
+    agent_id = (data or {}).get("agent_id")
+    if agent_id is not None:
+        join_room(agent_room(agent_id))
+
+
 if __name__ == '__main__':
     socketio.run(app, host="0.0.0.0", port=5001, debug=True)
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import threading
+
+import aiohttp
+
+
+class AsyncRuntime:
+    """
+    A dedicated asyncio loop on a daemon thread, shared by the Flask request handlers.
+
+    Handlers hand slow work (relay POSTs, sentiment calls) to the loop and return
+    straight away. All outgoing HTTP goes through one pooled keep-alive aiohttp
+    session instead of opening a new connection per requests.post.
+    """
+
+    def __init__(self, connection_limit=100, timeout=30):
+        self.connection_limit = connection_limit
+        self.timeout = timeout
+        self.loop = None
+        self._session = None
+        self._thread = None
+        self._lock = threading.Lock()
+        # key -> last task queued under that key, see run_in_order()
+        self._tails = {}
+        # Coroutines submitted and not finished yet (queue depth of the runtime)
+        self.pending = 0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name="async-runtime", daemon=True)
+                self._thread.start()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the runtime loop from any thread."""
+        self._ensure_started()
+        with self._lock:
+            self.pending += 1
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self._lock:
+            self.pending -= 1
+
+    def call_soon(self, callback, *args):
+        """Run a plain callback on the runtime loop from any thread."""
+        self._ensure_started()
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def run_in_order(self, key, coro):
+        """
+        Like submit(), but coroutines sharing a key run one after another in submission order.
+
+        Used so the events of one call reach the dashboard in the order they happened
+        while different calls still proceed concurrently.
+        """
+        return self.submit(self._after_previous(key, coro))
+
+    async def _after_previous(self, key, coro):
+        previous = self._tails.get(key)
+        current = asyncio.current_task()
+        self._tails[key] = current
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            return await coro
+        finally:
+            if self._tails.get(key) is current:
+                del self._tails[key]
+
+    async def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connection_limit, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def post_json(self, url, payload):
+        session = await self.session()
+        async with session.post(url, json=payload) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+
+runtime = AsyncRuntime(
+    connection_limit=int(os.getenv("HTTP_POOL_SIZE", "100")),
+    timeout=float(os.getenv("HTTP_TIMEOUT", "30"))
+)
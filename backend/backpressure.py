@@ -0,0 +1,287 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+
+from SentimentAgent.instrumentation import get_logger, span
+from async_runtime import runtime
+
+log = get_logger("backpressure")
+
+# Fill fraction (0-1) at which a stage reports itself busy / saturated
+BUSY_AT = 0.5
+SATURATED_AT = 0.9
+
+_sources = {}
+
+
+def register_source(name, status_fn):
+    """Add a stage to pipeline_status(); status_fn returns a dict with at least a "fill" fraction."""
+    _sources[name] = status_fn
+
+
+def saturation_level(fill):
+    if fill >= SATURATED_AT:
+        return "saturated"
+    if fill >= BUSY_AT:
+        return "busy"
+    return "ok"
+
+
+def pipeline_status():
+    """Fill of every registered stage and the worst level among them."""
+    stages = {name: status_fn() for name, status_fn in _sources.items()}
+    fill = max((stage["fill"] for stage in stages.values()), default=0.0)
+    return {"level": saturation_level(fill), "fill": round(fill, 3), "stages": stages}
+
+
+class CallScorer:
+    """
+    Scores live user utterances with at most one sentiment request per call queued or running.
+
+    Utterances that arrive while a call is waiting for a request slot are merged and scored
+    together, so a burst costs one request per call instead of one per utterance.
+    max_concurrency caps requests across calls. The backlog is bounded: at most max_waiting
+    calls have utterances waiting, and a call's waiting text is cut to its newest
+    max_text_chars. A failed request is retried with backoff, the retries on the sentiment
+    service's priority lane, before its utterances are given up.
+
+    Utterances turned away or given up are counted per call; pop_failures() tells the
+    end-of-call report that its live scores are incomplete, so the call gets a full analysis.
+
+    score_fn(call_id, text, priority) is a coroutine returning True on success. Everything
+    runs on the async runtime's loop; add() and after() may be called from any thread.
+    """
+
+    # Calls whose failures are remembered until their report; calls that never send one
+    # are forgotten oldest first past this many
+    MAX_FAILED_CALLS = 10000
+
+    def __init__(self, score_fn, max_concurrency=8, max_waiting=200, max_text_chars=8000, retries=2, retry_delay=0.5):
+        self.score_fn = score_fn
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.max_text_chars = max_text_chars
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._slots = None
+        self._texts = {}
+        self._active = set()
+        self._after = {}
+        self._failures = OrderedDict()
+        self.waiting = 0
+        self.in_flight = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def add(self, call_id, text):
+        runtime.call_soon(self._add, call_id, text)
+
+    def after(self, call_id, coro):
+        """Run coro once everything queued for the call so far has been scored."""
+        runtime.call_soon(self._add_after, call_id, coro)
+
+    def pop_failures(self, call_id):
+        """Utterances of the call that were never scored, forgetting them. Call on the runtime's loop."""
+        return self._failures.pop(call_id, 0)
+
+    def _fail(self, call_id, count):
+        self.failed += count
+        self._failures[call_id] = self._failures.pop(call_id, 0) + count
+        if len(self._failures) > self.MAX_FAILED_CALLS:
+            self._failures.popitem(last=False)
+
+    def _add(self, call_id, text):
+        pending = self._texts.get(call_id)
+        if pending is None:
+            if len(self._texts) >= self.max_waiting:
+                self._fail(call_id, 1)
+                log.warning("⚠️ Scoring backlog full (%d calls), not scoring an utterance of call %s", len(self._texts), call_id)
+                return
+            pending = self._texts[call_id] = []
+        else:
+            self.coalesced += 1
+        pending.append(text)
+        # Keep the newest text; the report's full analysis covers what is cut
+        dropped = 0
+        while len(pending) > 1 and sum(len(t) for t in pending) > self.max_text_chars:
+            pending.pop(0)
+            dropped += 1
+        if dropped:
+            self._fail(call_id, dropped)
+        if call_id not in self._active:
+            self._active.add(call_id)
+            asyncio.get_running_loop().create_task(self._drain(call_id))
+
+    def _add_after(self, call_id, coro):
+        if call_id in self._active:
+            self._after.setdefault(call_id, []).append(coro)
+        else:
+            asyncio.get_running_loop().create_task(coro)
+
+    async def _drain(self, call_id):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        try:
+            while self._texts.get(call_id):
+                self.waiting += 1
+                async with self._slots:
+                    self.waiting -= 1
+                    # Taken only now, so whatever arrived while waiting for the slot is included
+                    texts = self._texts.pop(call_id)
+                    self.in_flight += 1
+                    try:
+                        ok = await self._score(call_id, "\n".join(texts))
+                    finally:
+                        self.in_flight -= 1
+                if not ok:
+                    self._fail(call_id, len(texts))
+                    log.warning("⚠️ Gave up scoring %d utterances of call %s", len(texts), call_id)
+        finally:
+            self._active.discard(call_id)
+            for coro in self._after.pop(call_id, []):
+                asyncio.get_running_loop().create_task(coro)
+
+    async def _score(self, call_id, text):
+        for attempt in range(self.retries + 1):
+            # A retry most likely follows a 503 from a full queue, which priority requests skip
+            if await self.score_fn(call_id, text, priority=attempt > 0):
+                return True
+            if attempt < self.retries:
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        return False
+
+    def status(self):
+        return {
+            "fill": round(min(1.0, len(self._texts) / self.max_waiting), 3),
+            "calls": len(self._active),
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+        }
+
+
+class BroadcastQueue:
+    """
+    Bounded queue between the dashboard's event handlers and Socket.IO, coalesced per call.
+
+    A call has at most one pending entry: new transcript chunks are appended to it and
+    field changes overwrite older values, so a burst of updates leaves as one call_delta
+    per call and intermediate values (a risk score superseded before it was sent) are
+    dropped. Urgent entries (end-of-call reports, high-risk changes) are sent before
+    everything else and are always accepted.
+
+    When max_pending calls are already waiting, a normal update for another call is
+    applied to the broadcaster's state without being emitted; dashboards see the gap in
+    that call's seq numbers and catch up from its history.
+    """
+
+    def __init__(self, broadcaster, max_pending=500, on_status=None, status_interval=1.0):
+        self.broadcaster = broadcaster
+        self.max_pending = max_pending
+        self.on_status = on_status
+        self.status_interval = status_interval
+        self._entries = {}
+        self._urgent = deque()
+        self._normal = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._last_level = "ok"
+        self._last_status_at = 0.0
+        self._last_checked_at = 0.0
+        self.sent = 0
+        self.coalesced = 0
+        self.overflowed = 0
+
+    def start(self):
+        with self._cond:
+            if self._worker is None:
+                self._worker = self.broadcaster.socketio.start_background_task(self._run)
+
+    def submit(self, call_id, fields=None, chunk=None, urgent=False, then=None):
+        """Queue an update for the call; returns False if it was applied without an emit (queue full)."""
+        self.start()
+        with self._cond:
+            entry = self._entries.get(call_id)
+            if entry is None:
+                if not urgent and len(self._entries) >= self.max_pending:
+                    # Applied under the lock so a later queued update for the call gets a higher seq
+                    self.overflowed += 1
+                    self.broadcaster.update(call_id, fields or {}, chunks=[chunk] if chunk else None, emit=False)
+                    return False
+                else:
+                    entry = self._entries[call_id] = {"fields": {}, "chunks": [], "urgent": False, "then": []}
+                    (self._urgent if urgent else self._normal).append(call_id)
+            else:
+                self.coalesced += 1
+                if urgent and not entry["urgent"]:
+                    self._urgent.append(call_id)
+
+            entry["fields"].update(fields or {})
+            if chunk is not None:
+                entry["chunks"].append(chunk)
+            entry["urgent"] = entry["urgent"] or urgent
+            if then is not None:
+                entry["then"].append(then)
+            self._cond.notify()
+        return True
+
+    def close(self, call_id):
+        """Stop tracking the call once its queued updates have gone out."""
+        self.submit(call_id, urgent=True, then=lambda: self.broadcaster.close_call(call_id))
+
+    def _next(self):
+        with self._cond:
+            while True:
+                for lane in (self._urgent, self._normal):
+                    while lane:
+                        call_id = lane.popleft()
+                        entry = self._entries.pop(call_id, None)
+                        if entry is not None:
+                            return call_id, entry
+                if not self._cond.wait(timeout=self.status_interval):
+                    return None, None
+
+    def _run(self):
+        while True:
+            call_id, entry = self._next()
+            if entry is not None:
+                try:
+                    with span("broadcast_flush", lane="urgent" if entry["urgent"] else "normal"):
+                        self.broadcaster.update(call_id, entry["fields"], chunks=entry["chunks"])
+                    self.sent += 1
+                    for then in entry["then"]:
+                        then()
+                except Exception as e:
+                    log.exception("❌ Failed to broadcast update for call %s: %s", call_id, e)
+            self._report_status()
+
+    def _report_status(self):
+        now = time.monotonic()
+        if self.on_status is None or now - self._last_checked_at < 0.1:
+            return
+        self._last_checked_at = now
+        status = pipeline_status()
+        # Tell dashboards when the level changes, and keep reminding them while it is not ok
+        changed = status["level"] != self._last_level
+        if changed or (status["level"] != "ok" and now - self._last_status_at >= self.status_interval):
+            self._last_level = status["level"]
+            self._last_status_at = now
+            try:
+                self.on_status(status)
+            except Exception as e:
+                log.exception("❌ Failed to report pipeline status: %s", e)
+
+    def pending(self):
+        return len(self._entries)
+
+    def status(self):
+        return {
+            "fill": round(min(1.0, len(self._entries) / self.max_pending), 3),
+            "pending": len(self._entries),
+            "urgent": len(self._urgent),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "overflowed": self.overflowed,
+        }
@@ -0,0 +1,180 @@
+# bench_calls.py - memory and encode cost of the dashboard's per-call state at N concurrent calls
+#
+#   python bench_calls.py --calls 1000 --messages 60
+#
+# Builds N live calls the way the servers hold them (the CallData, the session's messages
+# and the broadcaster's transcript chunks) twice: with the slotted call_model records and
+# with the dict-per-object layout they replaced. For both it reports the memory traced
+# while building, and the time to encode every call's snapshot and one transcript delta
+# per call with the standard library json, serialization.dumps (orjson when installed)
+# and msgpack (when installed, the SOCKETIO_SERIALIZER=msgpack encoding).
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+from collections import deque
+
+from call_model import CallData, Transcript, Utterance
+import serialization
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+LINES = (
+    "I have been feeling really low and I can't sleep.",
+    "Everything at work is falling apart and nobody listens.",
+    "I just need someone to talk to right now.",
+    "Thank you for listening, that helps a little.",
+)
+
+
+class LegacyCallData:
+    """The previous CallData: same fields, held in a per-instance __dict__."""
+
+    def __init__(self, user_phone, user_name, call_duration, call_transcript, summary):
+        self.id = 0
+        self.user_phone = user_phone
+        self.user_name = user_name
+        self.call_duration = call_duration
+        self.self_harm_percentage = -1
+        self.homicidal_percentage = -1
+        self.psychosis_percentage = -1
+        self.distress_percentage = -1
+        self.call_priority = "Analyzing"
+        self.status = "in-progress"
+        self.risk_windows = []
+        self.recording_url = None
+        self.audio_features = None
+        self.call_transcript = call_transcript
+        self.summary = summary
+
+
+def conversation(calls, messages):
+    """Message texts per call, built before tracing so both layouts share the same strings."""
+    return [
+        [(("user", "bot")[m % 2], f"[c{c}:{m}] {random.choice(LINES)}", time.time() * 1000) for m in range(messages)]
+        for c in range(calls)
+    ]
+
+
+def build_compact(texts):
+    calls = []
+    for index, messages in enumerate(texts):
+        call = CallData(f"+1555{index:07d}", "Unknown", "0.0", "", "Call in progress...", id=index)
+        session = Transcript(1000)
+        chunks = Transcript(1000)
+        for role, message, at in messages:
+            session.append(Utterance(role, message, at))
+            chunks.append(Utterance(role, message, at))
+        calls.append((call, session, chunks))
+    return calls
+
+
+def build_legacy(texts):
+    calls = []
+    for index, messages in enumerate(texts):
+        call = LegacyCallData(f"+1555{index:07d}", "Unknown", "0.0", "", "Call in progress...")
+        call.id = index
+        session = deque(maxlen=1000)
+        chunks = deque(maxlen=1000)
+        for role, message, at in messages:
+            session.append({"role": role, "message": message, "time": at})
+            chunks.append({"role": role, "message": message, "time": at})
+        calls.append((call, session, chunks))
+    return calls
+
+
+def traced_mb(build, texts):
+    gc.collect()
+    tracemalloc.start()
+    calls = build(texts)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return calls, current / 1024 / 1024
+
+
+def payloads(calls, compact):
+    snapshots, deltas = [], []
+    for call, _, chunks in calls:
+        state = call.to_dict() if compact else dict(call.__dict__)
+        # As CallBroadcaster.catch_up builds them
+        transcript = chunks.to_dicts() if compact else list(chunks)
+        snapshots.append({"call_id": call.id, "seq": 0, "state": state, "transcript_chunks": transcript})
+        last = (chunks.segments if compact else chunks)[-1]
+        deltas.append({"call_id": call.id, "seq": 1, "changes": {"user_name": "Sam"}, "append": [last]})
+    return snapshots, deltas
+
+
+def encoders():
+    found = {
+        "json": lambda obj: json.dumps(obj, default=serialization.default, separators=(",", ":")),
+        "fast": serialization.dumps,
+    }
+    if msgpack is not None:
+        found["msgpack"] = lambda obj: msgpack.packb(obj, default=serialization.default)
+    return found
+
+
+def time_encode(encode, items, repeat):
+    best = float("inf")
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        encoded = [encode(item) for item in items]
+        best = min(best, time.perf_counter() - started)
+        size = sum(len(e) for e in encoded)
+    return round(best * 1000, 2), size
+
+
+def run(args):
+    random.seed(args.seed)
+    texts = conversation(args.calls, args.messages)
+    result = {
+        "config": {"calls": args.calls, "messages": args.messages, "orjson": serialization.orjson is not None},
+        "memory_mb": {},
+        "encode_ms": {}
+    }
+
+    for layout, build in (("legacy", build_legacy), ("compact", build_compact)):
+        calls, mb = traced_mb(build, texts)
+        result["memory_mb"][layout] = round(mb, 2)
+        snapshots, deltas = payloads(calls, layout == "compact")
+        for name, encode in encoders().items():
+            snapshot_ms, snapshot_bytes = time_encode(encode, snapshots, args.repeat)
+            delta_ms, delta_bytes = time_encode(encode, deltas, args.repeat)
+            result["encode_ms"][f"{layout}/{name}"] = {
+                "snapshots": snapshot_ms,
+                "deltas": delta_ms,
+                "snapshot_kb": round(snapshot_bytes / 1024, 1),
+                "delta_kb": round(delta_bytes / 1024, 1)
+            }
+        del calls, snapshots, deltas
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000, help="concurrent live calls")
+    parser.add_argument("--messages", type=int, default=60, help="transcript messages per call")
+    parser.add_argument("--repeat", type=int, default=5, help="encode passes, the fastest is reported")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    memory = result["memory_mb"]
+    print(f"📦 {args.calls} calls x {args.messages} messages: "
+          f"legacy {memory['legacy']} MB, compact {memory['compact']} MB "
+          f"({round(100 * (1 - memory['compact'] / memory['legacy']), 1)}% less)")
+    for name, figures in result["encode_ms"].items():
+        print(f"{name:>16}: snapshots {figures['snapshots']} ms ({figures['snapshot_kb']} KB), "
+              f"deltas {figures['deltas']} ms ({figures['delta_kb']} KB)")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"📄 Results written to {args.out}")
@@ -0,0 +1,135 @@
+import threading
+from collections import deque
+
+from SentimentAgent.instrumentation import span
+from call_model import Transcript
+
+# Every connected dashboard joins this room and gets call-level changes (new calls, risk, priority)
+LOBBY_ROOM = "calls"
+
+
+def call_room(call_id):
+    return f"call:{call_id}"
+
+
+def agent_room(agent_id):
+    return f"agent:{agent_id}"
+
+
+class CallBroadcaster:
+    """
+    Sends call changes to Socket.IO rooms as sequenced deltas instead of full call dicts.
+
+    Each call keeps its last sent state, a sequence number and a short history of
+    deltas. A delta carries only the fields that changed plus any new transcript
+    chunks; transcript-only deltas go to the call's room (and its agent's room),
+    anything else also to the lobby. A client that reconnects sends the last seq it
+    saw and is replayed the missing deltas, or sent a snapshot if they have already
+    left the history.
+
+    Lobby-only clients never see every seq, so deltas bound for the lobby also carry
+    a lobby_seq of their own. Field changes recorded without an emit are folded into
+    the call's next lobby delta, so the lobby never has to catch up. When a call is
+    closed, call_closed is sent so clients can forget it.
+
+    Sequence numbers are per process: with several servers on a message queue, the
+    events of one call must be routed to the same server (e.g. by call id).
+    """
+
+    def __init__(self, socketio, history=200, max_chunks=1000):
+        self.socketio = socketio
+        self.history_size = history
+        self.max_chunks = max_chunks
+        self.calls = {}
+        self.agents = {}
+        self.lock = threading.Lock()
+
+    def open_call(self, call_id, fields):
+        """Start tracking a call and announce it to the lobby as a new_call."""
+        with self.lock:
+            self.calls[call_id] = {
+                "seq": 0,
+                "state": dict(fields),
+                "chunks": Transcript(self.max_chunks),
+                "history": deque(maxlen=self.history_size),
+                "lobby_seq": 0,
+                # Field changes the lobby hasn't been sent yet
+                "lobby_pending": {},
+            }
+        with span("socketio_emit", event="new_call"):
+            self.socketio.emit('new_call', dict(fields, seq=0, lobby_seq=0), to=LOBBY_ROOM)
+
+    def close_call(self, call_id):
+        with self.lock:
+            if self.calls.pop(call_id, None) is None:
+                return
+            self.agents.pop(call_id, None)
+        self.socketio.emit('call_closed', {"call_id": call_id}, to=[LOBBY_ROOM, call_room(call_id)])
+
+    def assign(self, call_id, agent_id):
+        """Route the call's future deltas to an agent's room as well."""
+        with self.lock:
+            self.agents[call_id] = agent_id
+
+    def update(self, call_id, fields, chunk=None, chunks=None, emit=True):
+        """
+        Apply field changes and new transcript chunks as one delta and send it to the call's rooms.
+        With emit=False the delta is only recorded; subscribers pick it up through catch_up().
+        """
+        chunks = list(chunks or [])
+        if chunk is not None:
+            chunks.append(chunk)
+        with self.lock:
+            call = self.calls.get(call_id)
+            if call is None:
+                return None
+
+            changes = {k: v for k, v in fields.items() if call["state"].get(k) != v}
+            if not changes and not chunks:
+                return None
+
+            call["state"].update(changes)
+            call["seq"] += 1
+            delta = {"call_id": call_id, "seq": call["seq"], "changes": changes}
+            if chunks:
+                call["chunks"].extend(chunks)
+                delta["append"] = chunks
+            call["history"].append(delta)
+            if not emit:
+                call["lobby_pending"].update(changes)
+                return delta
+
+            message = delta
+            rooms = [call_room(call_id)]
+            if call_id in self.agents:
+                rooms.append(agent_room(self.agents[call_id]))
+            if changes or call["lobby_pending"]:
+                call["lobby_seq"] += 1
+                # Subscribers get the pending changes again too; they are current values
+                lobby_changes = {**call["lobby_pending"], **changes}
+                call["lobby_pending"] = {}
+                message = dict(delta, changes=lobby_changes, lobby_seq=call["lobby_seq"])
+                rooms.append(LOBBY_ROOM)
+
+        with span("socketio_emit", event="call_delta"):
+            self.socketio.emit('call_delta', message, to=rooms)
+        return delta
+
+    def catch_up(self, call_id, since_seq):
+        """Deltas after since_seq, or a full snapshot if the history no longer reaches back that far."""
+        with self.lock:
+            call = self.calls.get(call_id)
+            if call is None:
+                return None, None
+
+            history = call["history"]
+            if since_seq is not None and (not history or history[0]["seq"] <= since_seq + 1):
+                return [d for d in history if d["seq"] > since_seq], None
+
+            return None, {
+                "call_id": call_id,
+                "seq": call["seq"],
+                "lobby_seq": call["lobby_seq"],
+                "state": dict(call["state"]),
+                "transcript_chunks": call["chunks"].to_dicts(),
+            }
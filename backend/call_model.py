@@ -0,0 +1,138 @@
+from collections import deque
+from dataclasses import dataclass, field
+
+from sentiment_client import analyze_text, normalize_score, risk_points
+from triage import composite_risk
+
+# Slotted records for everything held per live call. A 1k-call dashboard keeps every
+# call and up to SESSION_MAX_MESSAGES messages per call in memory, so these avoid a
+# per-instance __dict__ (see bench_calls.py for the numbers).
+
+
+@dataclass(slots=True)
+class Utterance:
+    """One transcript message. Serialized as {"role", "message", "time"} like the dicts it replaces."""
+    role: str
+    message: str
+    time: float = None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("role"), data.get("message"), data.get("time"))
+
+    def to_dict(self):
+        return {"role": self.role, "message": self.message, "time": self.time}
+
+    def line(self):
+        return f"{(self.role or '').capitalize()}: {self.message}"
+
+
+class Transcript:
+    """
+    Append-only transcript segments, keeping the last maxlen of them if maxlen is set.
+
+    Messages are only ever appended, so readers copy (to_dicts, text) once at the end
+    of a call instead of the transcript being rebuilt as one string on every update.
+    """
+
+    __slots__ = ("segments",)
+
+    def __init__(self, maxlen=None):
+        self.segments = deque(maxlen=maxlen)
+
+    def append(self, utterance):
+        self.segments.append(utterance)
+
+    def extend(self, utterances):
+        self.segments.extend(utterances)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __iter__(self):
+        return iter(self.segments)
+
+    def to_dicts(self):
+        return [u.to_dict() for u in self.segments]
+
+    def text(self):
+        return "\n".join(u.line() for u in self.segments)
+
+
+@dataclass(slots=True)
+class CallData:
+    user_phone: str
+    user_name: str
+    call_duration: str
+    call_transcript: str
+    summary: str
+    id: int = 0
+    self_harm_percentage: float = -1
+    homicidal_percentage: float = -1
+    psychosis_percentage: float = -1
+    distress_percentage: float = -1
+    call_priority: str = "Analyzing"
+    status: str = "in-progress"
+    # Per-window scores of the last full-transcript analysis, for highlighting where risk peaked
+    risk_windows: list = field(default_factory=list)
+    # Call recording and the prosody features extracted from it, once analyzed
+    recording_url: str = None
+    audio_features: dict = None
+
+    def to_dict(self):
+        """Shallow dict of every field, what the dashboard and the webhook response receive."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    async def update_status_percentages(self):
+        if self.call_transcript is None:
+            return
+
+        # Make call to backend huggingface model
+        # Only finished calls are analyzed in full; they take the sentiment service's priority lane
+        sentiment_analysis = await analyze_text(self.call_transcript, self.recording_url, priority=True)
+        if sentiment_analysis is None:
+            return
+
+        # Scores accumulated live are peaks; a whole-call analysis must not lower them
+        self.apply_sentiment(sentiment_analysis, keep_peaks=self.self_harm_percentage >= 0)
+        return sentiment_analysis
+
+    def apply_sentiment(self, sentiment_analysis, keep_peaks=False):
+        scores = {
+            "self_harm_percentage": normalize_score(sentiment_analysis.get("self_harm")),
+            "homicidal_percentage": normalize_score(sentiment_analysis.get("homicidal")),
+            "psychosis_percentage": normalize_score(sentiment_analysis.get("psychosis")),
+            "distress_percentage": normalize_score(sentiment_analysis.get("distress"))
+        }
+        for name, score in scores.items():
+            setattr(self, name, max(score, getattr(self, name)) if keep_peaks else score)
+        if sentiment_analysis.get("windows"):
+            self.risk_windows = sentiment_analysis["windows"]
+        if sentiment_analysis.get("audio"):
+            self.audio_features = sentiment_analysis["audio"]["features"]
+
+    def risk_assessment(self):
+        return {
+            "selfHarm": self.self_harm_percentage,
+            "distress": self.distress_percentage,
+            "homicidal": self.homicidal_percentage,
+            "psychosis": self.psychosis_percentage
+        }
+
+    def composite_risk(self):
+        return composite_risk([
+            risk_points(self.self_harm_percentage),
+            risk_points(self.homicidal_percentage),
+            risk_points(self.psychosis_percentage),
+            risk_points(self.distress_percentage)
+        ])
+
+    def update_call_priority(self):
+        # The percentages are on the dashboard's 0-10000 scale, the cutoff is on the service's 0-100
+        risks = [self.self_harm_percentage, self.homicidal_percentage, self.psychosis_percentage, self.distress_percentage]
+        if any(risk_points(p) > 80.0 for p in risks):
+            self.call_priority = "High Priority"
+        else:
+            self.call_priority = "Normal"
+
+        return self.call_priority
@@ -0,0 +1,265 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from SentimentAgent.instrumentation import get_logger, span
+from sentiment_client import risk_points
+
+log = get_logger("call_store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    vapi_call_id TEXT,
+    user_phone TEXT,
+    user_name TEXT,
+    call_duration TEXT,
+    summary TEXT,
+    call_transcript TEXT,
+    call_priority TEXT,
+    status TEXT,
+    self_harm REAL,
+    homicidal REAL,
+    psychosis REAL,
+    distress REAL,
+    max_risk REAL,
+    started_at REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_calls_phone ON calls (user_phone, started_at);
+CREATE INDEX IF NOT EXISTS idx_calls_priority ON calls (call_priority, started_at);
+CREATE INDEX IF NOT EXISTS idx_calls_started ON calls (started_at);
+CREATE INDEX IF NOT EXISTS idx_calls_max_risk ON calls (max_risk);
+
+CREATE TABLE IF NOT EXISTS transcript_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    call_id INTEGER NOT NULL,
+    role TEXT,
+    message TEXT,
+    time REAL
+);
+CREATE INDEX IF NOT EXISTS idx_transcript_call ON transcript_messages (call_id, id);
+
+CREATE TABLE IF NOT EXISTS risk_scores (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    call_id INTEGER NOT NULL,
+    recorded_at REAL,
+    self_harm REAL,
+    homicidal REAL,
+    psychosis REAL,
+    distress REAL
+);
+CREATE INDEX IF NOT EXISTS idx_risk_call ON risk_scores (call_id, id);
+"""
+
+# Schema version 1: max_risk on the service's 0-100 scale (risk_points), NULL while unscored;
+# it used to hold the highest dashboard percentage (0-10000, -1 unscored)
+SCHEMA_VERSION = 1
+_MIGRATE_MAX_RISK = "UPDATE calls SET max_risk = CASE WHEN max_risk < 0 THEN NULL ELSE MIN(max_risk / 100, 100) END"
+
+CALL_COLUMNS = (
+    "id", "vapi_call_id", "user_phone", "user_name", "call_duration", "summary", "call_transcript",
+    "call_priority", "status", "self_harm", "homicidal", "psychosis", "distress", "max_risk",
+    "started_at", "updated_at"
+)
+
+# started_at is only set by the first insert of a call
+_UPSERT_CALL = (
+    f"INSERT INTO calls ({', '.join(CALL_COLUMNS)}) VALUES ({', '.join('?' * len(CALL_COLUMNS))}) "
+    "ON CONFLICT(id) DO UPDATE SET "
+    + ", ".join(f"{c} = COALESCE(excluded.{c}, {c})" for c in CALL_COLUMNS if c not in ("id", "started_at"))
+)
+
+_INSERT_MESSAGE = "INSERT INTO transcript_messages (call_id, role, message, time) VALUES (?, ?, ?, ?)"
+
+_INSERT_RISK = (
+    "INSERT INTO risk_scores (call_id, recorded_at, self_harm, homicidal, psychosis, distress) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+class CallStore:
+    """
+    SQLite history of calls, their transcripts and their per-utterance risk scores.
+
+    Writes never touch the database on the caller's thread: they are queued and a
+    single writer thread commits them in batches (up to batch_size statements or
+    every flush_interval seconds), so the webhook path only pays for a queue put.
+    Reads use one connection per thread; WAL mode lets them run next to the writer.
+    """
+
+    def __init__(self, path="calls.db", batch_size=500, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._local = threading.local()
+
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            with conn:
+                conn.execute(_MIGRATE_MAX_RISK)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name="call-store-writer", daemon=True)
+        self._writer.start()
+
+    # Writes
+
+    def save_call(self, call, vapi_call_id=None):
+        risks = [call.self_harm_percentage, call.homicidal_percentage, call.psychosis_percentage, call.distress_percentage]
+        # max_risk is on the same 0-100 scale as the triage queue's composite risk; NULL until scored
+        scored = [risk_points(r) for r in risks if r is not None and r >= 0]
+        now = time.time()
+        row = (
+            call.id, vapi_call_id, call.user_phone, call.user_name, call.call_duration, call.summary,
+            call.call_transcript, call.call_priority, call.status, *risks,
+            max(scored) if scored else None,
+            now, now
+        )
+        self._queue.put((_UPSERT_CALL, row))
+
+    def add_message(self, call_id, role, message, timestamp):
+        self._queue.put((_INSERT_MESSAGE, (call_id, role, message, timestamp)))
+
+    def add_risk_score(self, call_id, call):
+        row = (
+            call_id, time.time(), call.self_harm_percentage, call.homicidal_percentage,
+            call.psychosis_percentage, call.distress_percentage
+        )
+        self._queue.put((_INSERT_RISK, row))
+
+    def pending(self):
+        """Writes queued and not yet committed."""
+        return self._queue.qsize()
+
+    def flush(self, timeout=5):
+        """Block until everything queued so far is committed."""
+        done = threading.Event()
+        self._queue.put((None, done))
+        return done.wait(timeout)
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            waiters = []
+            try:
+                with span("call_store_commit"), conn:
+                    for sql, params in batch:
+                        if sql is None:
+                            waiters.append(params)
+                        else:
+                            conn.execute(sql, params)
+            except sqlite3.Error as e:
+                log.error("❌ Failed to write %d call store rows: %s", len(batch), e)
+            for waiter in waiters:
+                waiter.set()
+
+    # Reads
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def list_calls(self, page=1, page_size=50, phone=None, priority=None, status=None,
+                   since=None, until=None, min_risk=None):
+        """Most recent calls first, filtered on indexed columns, one page at a time. min_risk is 0-100."""
+        clauses, params = [], []
+        if phone:
+            clauses.append("user_phone = ?")
+            params.append(phone)
+        if priority:
+            clauses.append("call_priority = ?")
+            params.append(priority)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if since is not None:
+            clauses.append("started_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("started_at < ?")
+            params.append(until)
+        if min_risk is not None:
+            clauses.append("max_risk >= ?")
+            params.append(min_risk)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        page = max(1, page)
+        page_size = max(1, min(page_size, 500))
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM calls {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT * FROM calls {where} ORDER BY started_at DESC, id DESC LIMIT ? OFFSET ?",
+            params + [page_size, (page - 1) * page_size]
+        ).fetchall()
+        return {
+            "page": page,
+            "page_size": page_size,
+            "total": total,
+            "calls": [self._call_json(row) for row in rows]
+        }
+
+    def get_call(self, call_id):
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM calls WHERE id = ?", (call_id,)).fetchone()
+        if row is None:
+            return None
+        call = self._call_json(row)
+        call["transcript_chunks"] = [
+            {"role": m["role"], "message": m["message"], "time": m["time"]}
+            for m in conn.execute(
+                "SELECT role, message, time FROM transcript_messages WHERE call_id = ? ORDER BY id", (call_id,)
+            )
+        ]
+        call["risk_history"] = [
+            dict(r) for r in conn.execute(
+                "SELECT recorded_at, self_harm, homicidal, psychosis, distress FROM risk_scores "
+                "WHERE call_id = ? ORDER BY id", (call_id,)
+            )
+        ]
+        return call
+
+    def max_call_id(self):
+        return self._conn().execute("SELECT MAX(id) FROM calls").fetchone()[0]
+
+    @staticmethod
+    def _call_json(row):
+        # Same field names as CallData so the dashboard can treat both alike
+        return {
+            "id": row["id"],
+            "user_phone": row["user_phone"],
+            "user_name": row["user_name"],
+            "call_duration": row["call_duration"],
+            "summary": row["summary"],
+            "call_transcript": row["call_transcript"],
+            "call_priority": row["call_priority"],
+            "status": row["status"],
+            "self_harm_percentage": row["self_harm"],
+            "homicidal_percentage": row["homicidal"],
+            "psychosis_percentage": row["psychosis"],
+            "distress_percentage": row["distress"],
+            "max_risk": row["max_risk"],
+            "started_at": row["started_at"]
+        }
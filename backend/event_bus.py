@@ -0,0 +1,148 @@
+import asyncio
+import time
+from dataclasses import asdict, dataclass, field
+
+import aiohttp
+
+from SentimentAgent.instrumentation import get_logger, metrics, span
+from async_runtime import runtime
+
+log = get_logger("event_bus")
+events_published = metrics.counter("serenity_events_published_total", "Events published on the bus, by event")
+relay_failures = metrics.counter("serenity_relay_failures_total", "Events the HTTP transport failed to deliver")
+relay_retries = metrics.counter("serenity_relay_retries_total", "HTTP transport posts retried after an error, by event")
+handler_failures = metrics.counter("serenity_handler_failures_total", "Bus subscribers that raised, by event")
+
+
+@dataclass
+class NewCall:
+    name = "new_call"
+    call_id: str
+    user_phone: str
+    user_name: str = "Unknown"
+
+
+@dataclass
+class LiveTranscriptUpdate:
+    name = "live_transcript_update"
+    call_id: str
+    user_phone: str
+    user_name: str
+    role: str
+    message: str
+    timestamp: float = None
+
+
+@dataclass
+class RiskAssessmentUpdate:
+    name = "risk_assessment_update"
+    call_id: str
+    scores: dict = field(default_factory=dict)
+
+
+@dataclass
+class CallReport:
+    name = "call_report"
+    call_id: str
+    user_phone: str
+    user_name: str
+    call_duration: str
+    call_transcript: str
+    summary: str
+    risk_scores: dict = None
+    recording_url: str = None
+    # Some utterances were never scored live, so risk_scores may miss them
+    scores_incomplete: bool = False
+
+
+EVENT_TYPES = {cls.name: cls for cls in (NewCall, LiveTranscriptUpdate, RiskAssessmentUpdate, CallReport)}
+
+
+def event_to_dict(event):
+    return {"type": event.name, "data": asdict(event)}
+
+
+def event_from_dict(data):
+    return EVENT_TYPES[data["type"]](**data["data"])
+
+
+class LocalTransport:
+    """Delivers events to the subscribers in this process, synchronously and in publish order."""
+
+    def __init__(self, bus):
+        self.bus = bus
+
+    def send(self, event):
+        self.bus.dispatch(event)
+
+
+class HttpTransport:
+    """
+    Forwards events to a bus in another process, which receives them on its /events endpoint.
+
+    Posts are queued on the async runtime so the publisher never waits on the network,
+    and events of the same call are delivered in publish order. A failed post is retried
+    with exponential backoff for up to retry_seconds, or call_retry_seconds for NewCall
+    and CallReport: losing one of those leaves the call open on the dashboard. Rejected
+    events (4xx other than 429) are not retried.
+    """
+
+    def __init__(self, url, retry_seconds=60.0, call_retry_seconds=600.0, retry_delay=0.5, max_retry_delay=30.0):
+        self.url = url
+        self.retry_seconds = retry_seconds
+        self.call_retry_seconds = call_retry_seconds
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+    def send(self, event):
+        runtime.run_in_order(("relay", event.call_id), self._post(event))
+
+    async def _post(self, event):
+        lifecycle = isinstance(event, (NewCall, CallReport))
+        deadline = time.monotonic() + (self.call_retry_seconds if lifecycle else self.retry_seconds)
+        delay = self.retry_delay
+        while True:
+            try:
+                with span("relay_post", event=event.name):
+                    await runtime.post_json(self.url, event_to_dict(event))
+                log.debug("📤 %s sent for call %s", event.name, event.call_id)
+                return True
+            except Exception as e:
+                rejected = isinstance(e, aiohttp.ClientResponseError) and 400 <= e.status < 500 and e.status != 429
+                if rejected or time.monotonic() + delay > deadline:
+                    relay_failures.inc()
+                    log.error("❌ Failed to send %s for call %s: %s", event.name, event.call_id, e)
+                    return False
+                relay_retries.inc(event=event.name)
+                log.warning("⚠️ Sending %s for call %s failed (%s), retrying in %.1fs", event.name, event.call_id, e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+
+
+class EventBus:
+    """In-memory publish/subscribe bus connecting Vapi ingestion, scoring and the dashboard."""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.transport = LocalTransport(self)
+
+    def use_transport(self, transport):
+        self.transport = transport
+
+    def subscribe(self, event_type, handler):
+        self.subscribers.setdefault(event_type.name, []).append(handler)
+
+    def publish(self, event):
+        events_published.inc(event=event.name)
+        self.transport.send(event)
+
+    def dispatch(self, event):
+        for handler in self.subscribers.get(event.name, []):
+            try:
+                handler(event)
+            except Exception as e:
+                handler_failures.inc(event=event.name)
+                log.exception("❌ Handler %s failed on %s: %s", handler.__name__, event.name, e)
+
+
+bus = EventBus()
@@ -0,0 +1,14 @@
+# Production server for server.py (and app2.py):
+#
+#   gunicorn server:app
+#
+# Flask-SocketIO runs in threading mode, so one gthread worker serves every socket;
+# several workers need sticky sessions and SOCKETIO_MESSAGE_QUEUE to share clients.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+# Each connected dashboard holds a thread for its WebSocket
+threads = int(os.getenv("GUNICORN_THREADS", "100"))
+timeout = 0
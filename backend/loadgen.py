@@ -0,0 +1,412 @@
+# loadgen.py - replay synthetic Vapi traffic against the webhook and measure what dashboards see
+#
+#   python loadgen.py --calls 50 --messages 20 --rate 2 --delay-ms 50 --out results.json
+#   python loadgen.py --url http://localhost:5001 --pid 1234     (an already running server.py)
+#   python loadgen.py --baseline last.json --max-regression 0.2  (exit 1 on a regression)
+#   python loadgen.py --gunicorn                                 (server.py under gunicorn, as deployed)
+#
+# By default it starts a sentiment stub (sentiment_stub.py) and a fresh server.py pointed at it,
+# runs `--calls` concurrent calls that each send `--messages` speech-updates at `--rate` per
+# second followed by an end-of-call-report, and listens with `--dashboards` Socket.IO clients.
+#
+# Latencies are measured from posting a webhook to a dashboard receiving the resulting event:
+#   transcript:   a speech-update's new message arriving as a call_delta chunk
+#   risk:         a user message's score arriving as a risk change on the call
+#   final_report: the end-of-call-report arriving as the call's "completed" status
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import aiohttp
+import socketio
+
+from sentiment_stub import start_stub, stub_step
+
+USER_LINES = [
+    "I haven't been sleeping and everything feels heavy.",
+    "My name is Alex and I just needed someone to talk to.",
+    "I keep hearing things at night and it scares me.",
+    "I lost my job last week and I don't know what to do.",
+    "Some days I feel like there's no way out.",
+    "I'm angry all the time and I don't know why.",
+]
+BOT_LINES = [
+    "Thank you for sharing that, I'm here with you.",
+    "It's okay to take your time.",
+    "Can you tell me a bit more about what's been happening?",
+    "That sounds really hard. Are you safe right now?",
+]
+
+
+def summarize(values):
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))], 2)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+        "max": round(ordered[-1], 2)
+    }
+
+
+def rss_mb(pid):
+    """Resident memory of a process in MB (Linux only), or None."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+class Recorder:
+    """Send times of everything the callers posted, and the latencies the dashboards observed."""
+
+    def __init__(self):
+        self.transcript_sent = {}
+        self.risk_sent = defaultdict(list)
+        self.final_sent = {}
+        self.webhook_ms = []
+        self.latencies = {"transcript": [], "risk": [], "final_report": []}
+        self.events = 0
+        self.gaps = 0
+        self.errors = defaultdict(int)
+
+    def expected(self, dashboards):
+        return {
+            "transcript": len(self.transcript_sent) * dashboards,
+            "risk": sum(len(v) for v in self.risk_sent.values()) * dashboards,
+            "final_report": len(self.final_sent) * dashboards
+        }
+
+    def received(self, kind, sent_at, now):
+        if sent_at is not None:
+            self.latencies[kind].append((now - sent_at) * 1000)
+
+
+class Dashboard:
+    """A Socket.IO client that follows every call like a dashboard with each call open: lobby plus the call's room."""
+
+    def __init__(self, url, recorder, serializer="default"):
+        self.url = url
+        self.recorder = recorder
+        self.sio = socketio.AsyncClient(reconnection=False, serializer=serializer)
+        self.phones = {}
+        self.last_seq = {}
+        self.seen_messages = set()
+        self.risk_seen = defaultdict(int)
+        self.completed = set()
+        self.sio.on("new_call", self.on_new_call)
+        self.sio.on("call_delta", self.on_call_delta)
+        self.sio.on("call_snapshot", self.on_call_snapshot)
+        self.sio.on("call_closed", self.on_call_closed)
+
+    async def connect(self):
+        await self.sio.connect(self.url, transports=["websocket"])
+
+    async def disconnect(self):
+        await self.sio.disconnect()
+
+    async def on_new_call(self, data):
+        self.recorder.events += 1
+        self.phones[data["id"]] = data.get("user_phone")
+        self.last_seq[data["id"]] = data.get("seq", 0)
+        await self.sio.emit("subscribe", {"call_id": data["id"], "since_seq": data.get("seq", 0)})
+
+    async def on_call_delta(self, delta):
+        now = time.perf_counter()
+        self.recorder.events += 1
+        call_id = delta["call_id"]
+        # The same delta reaches us through the call room and the lobby
+        last = self.last_seq.get(call_id, -1)
+        if delta["seq"] <= last:
+            return
+        if last >= 0 and delta["seq"] > last + 1:
+            # The server skipped this call's update while overloaded: catch up like the dashboard does
+            self.recorder.gaps += 1
+            await self.sio.emit("subscribe", {"call_id": call_id, "since_seq": last})
+            return
+        self.last_seq[call_id] = delta["seq"]
+        self._observe(call_id, delta.get("changes", {}), delta.get("append", []), now)
+
+    async def on_call_closed(self, data):
+        self.last_seq.pop(data["call_id"], None)
+
+    async def on_call_snapshot(self, snapshot):
+        now = time.perf_counter()
+        self.recorder.events += 1
+        self.last_seq[snapshot["call_id"]] = snapshot["seq"]
+        self._observe(snapshot["call_id"], {}, snapshot.get("transcript_chunks", []), now)
+
+    def _observe(self, call_id, changes, chunks, now):
+        phone = self.phones.get(call_id)
+        for chunk in chunks:
+            message = chunk.get("message")
+            if message not in self.seen_messages:
+                self.seen_messages.add(message)
+                self.recorder.received("transcript", self.recorder.transcript_sent.get(message), now)
+
+        if "distress_percentage" in changes and phone is not None:
+            # The stub's score says which user message it reflects; under load several
+            # messages are scored together and one risk change answers all of them
+            sent = self.recorder.risk_sent.get(phone, [])
+            step = min(stub_step(changes["distress_percentage"]), len(sent))
+            for index in range(self.risk_seen[phone], step):
+                self.recorder.received("risk", sent[index], now)
+            self.risk_seen[phone] = max(self.risk_seen[phone], step)
+
+        if changes.get("status") == "completed" and phone not in self.completed:
+            self.completed.add(phone)
+            self.recorder.received("final_report", self.recorder.final_sent.get(phone), now)
+
+
+async def post_webhook(session, url, payload, recorder):
+    started = time.perf_counter()
+    try:
+        async with session.post(url, json=payload) as response:
+            await response.read()
+            if response.status >= 400:
+                recorder.errors[f"http_{response.status}"] += 1
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        recorder.errors[type(e).__name__] += 1
+    recorder.webhook_ms.append((time.perf_counter() - started) * 1000)
+
+
+async def run_call(session, webhook_url, run_id, index, args, recorder):
+    """One synthetic call: cumulative speech-updates (as Vapi sends them), then the final report."""
+    await asyncio.sleep(random.uniform(0, args.ramp))
+    vapi_id = f"load-{run_id}-{index}"
+    phone = f"+1555{index:07d}"
+    messages = [{"role": "system", "message": "You are a crisis line assistant.", "time": time.time() * 1000}]
+    user_turns = 0
+
+    for turn in range(args.messages):
+        role = "user" if turn % 2 == 0 else "bot"
+        if role == "user":
+            user_turns += 1
+            text = f"[c{index}:{user_turns}] {random.choice(USER_LINES)}"
+        else:
+            text = f"[c{index}-bot:{turn}] {random.choice(BOT_LINES)}"
+        messages.append({"role": role, "message": text, "time": time.time() * 1000})
+        payload = {"message": {
+            "type": "speech-update",
+            "call": {"id": vapi_id},
+            "customer": {"number": phone},
+            "artifact": {"messages": list(messages)}
+        }}
+
+        sent_at = time.perf_counter()
+        recorder.transcript_sent[text] = sent_at
+        if role == "user":
+            recorder.risk_sent[phone].append(sent_at)
+        await post_webhook(session, webhook_url, payload, recorder)
+        await asyncio.sleep(1 / args.rate)
+
+    recorder.final_sent[phone] = time.perf_counter()
+    await post_webhook(session, webhook_url, {"message": {
+        "type": "end-of-call-report",
+        "call": {"id": vapi_id},
+        "analysis": {"summary": "Synthetic load test call."}
+    }}, recorder)
+
+
+def start_server(args, stub_url, workdir):
+    env = dict(
+        os.environ,
+        PORT=str(args.port),
+        SENTIMENT_URL=stub_url,
+        CALL_STORE_PATH=os.path.join(workdir, "calls.db"),
+        SOCKETIO_SERIALIZER="msgpack" if args.msgpack else "json",
+        ALLOW_UNSAFE_WERKZEUG="1",
+    )
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    command = [sys.executable, "-m", "gunicorn", "server:app"] if args.gunicorn else [sys.executable, "server.py"]
+    return subprocess.Popen(
+        command,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+async def wait_until_up(session, url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            async with session.get(url + "/calls/snapshot") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not come up within {timeout}s")
+
+
+async def sample_memory(pid, samples, interval=0.5):
+    while True:
+        value = rss_mb(pid)
+        if value is not None:
+            samples.append(value)
+        await asyncio.sleep(interval)
+
+
+async def run(args):
+    run_id = f"{int(time.time())}"
+    recorder = Recorder()
+    stub = server = None
+    workdir = tempfile.mkdtemp(prefix="serenity-load-")
+    url, pid = args.url, args.pid
+
+    if not url:
+        stub = await start_stub(args.stub_port, args.delay_ms, args.jitter_ms)
+        server = start_server(args, f"http://127.0.0.1:{args.stub_port}/", workdir)
+        url, pid = f"http://127.0.0.1:{args.port}", server.pid
+    webhook_url = url + args.webhook_path
+
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    memory = []
+    sampler = None
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30)) as session:
+            await wait_until_up(session, url)
+            dashboards = [Dashboard(url, recorder, "msgpack" if args.msgpack else "default") for _ in range(args.dashboards)]
+            for dashboard in dashboards:
+                await dashboard.connect()
+
+            rss_start = rss_mb(pid) if pid else None
+            if pid:
+                sampler = asyncio.create_task(sample_memory(pid, memory))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                run_call(session, webhook_url, run_id, i, args, recorder) for i in range(args.calls)
+            ))
+            sent_seconds = time.perf_counter() - started
+
+            # Let the pipeline drain: stop once every expected event arrived or nothing new shows up
+            expected = recorder.expected(args.dashboards)
+            deadline = time.perf_counter() + args.drain_timeout
+            while time.perf_counter() < deadline:
+                if all(len(recorder.latencies[k]) >= n for k, n in expected.items()):
+                    break
+                await asyncio.sleep(0.1)
+            total_seconds = time.perf_counter() - started
+            rss_end = rss_mb(pid) if pid else None
+
+            for dashboard in dashboards:
+                await dashboard.disconnect()
+    finally:
+        if sampler:
+            sampler.cancel()
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+        if stub:
+            await stub.cleanup()
+
+    webhooks = len(recorder.webhook_ms)
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "latency_ms": {
+            "webhook_response": summarize(recorder.webhook_ms),
+            **{kind: summarize(values) for kind, values in recorder.latencies.items()}
+        },
+        "missing": {kind: max(0, n - len(recorder.latencies[kind])) for kind, n in expected.items()},
+        "throughput": {
+            "webhooks": webhooks,
+            "send_seconds": round(sent_seconds, 2),
+            "total_seconds": round(total_seconds, 2),
+            "webhooks_per_s": round(webhooks / sent_seconds, 1) if sent_seconds else 0.0,
+            "dashboard_events": recorder.events,
+            "dashboard_events_per_s": round(recorder.events / total_seconds, 1) if total_seconds else 0.0,
+            "seq_gaps": recorder.gaps
+        },
+        "memory_mb": {
+            "rss_start": rss_start,
+            "rss_peak": max(memory) if memory else None,
+            "rss_end": rss_end,
+            "growth": round(rss_end - rss_start, 1) if rss_start is not None and rss_end is not None else None
+        },
+        "errors": dict(recorder.errors)
+    }
+
+
+def find_regressions(result, baseline, max_regression):
+    """p95 latencies that got worse, and throughput that dropped, by more than max_regression (a fraction)."""
+    regressions = []
+    for kind, figures in result["latency_ms"].items():
+        before = baseline.get("latency_ms", {}).get(kind, {}).get("p95")
+        after = figures.get("p95")
+        if before and after is not None and after > before * (1 + max_regression):
+            regressions.append(f"{kind} p95 {before} -> {after} ms")
+    before = baseline.get("throughput", {}).get("webhooks_per_s")
+    after = result["throughput"]["webhooks_per_s"]
+    if before and after < before * (1 - max_regression):
+        regressions.append(f"webhooks_per_s {before} -> {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20, help="concurrent calls")
+    parser.add_argument("--messages", type=int, default=10, help="speech-updates per call")
+    parser.add_argument("--rate", type=float, default=2.0, help="speech-updates per second per call")
+    parser.add_argument("--ramp", type=float, default=1.0, help="seconds over which call starts are spread")
+    parser.add_argument("--dashboards", type=int, default=1, help="Socket.IO clients listening")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--delay-ms", type=float, default=50.0, help="sentiment stub delay")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="sentiment stub delay variation")
+    parser.add_argument("--port", type=int, default=5101, help="port for the server started by the test")
+    parser.add_argument("--stub-port", type=int, default=8100, help="port for the sentiment stub")
+    parser.add_argument("--gunicorn", action="store_true", help="start the server under gunicorn instead of the dev server")
+    parser.add_argument("--url", help="test an already running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="pid of that server, for memory figures")
+    parser.add_argument("--webhook-path", default="/vapi/vapi-webhook")
+    parser.add_argument("--msgpack", action="store_true", help="binary Socket.IO payloads (SOCKETIO_SERIALIZER=msgpack)")
+    parser.add_argument("--drain-timeout", type=float, default=15.0, help="seconds to wait for the last events")
+    parser.add_argument("--server-log", help="file for the started server's output")
+    parser.add_argument("--out", default="loadgen_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    for kind, figures in result["latency_ms"].items():
+        if figures["count"]:
+            print(f"{kind:>16}: p50 {figures['p50']} ms, p95 {figures['p95']} ms, p99 {figures['p99']} ms ({figures['count']})")
+    print(f"throughput: {result['throughput']['webhooks_per_s']} webhooks/s, "
+          f"{result['throughput']['dashboard_events_per_s']} dashboard events/s")
+    print(f"memory: {result['memory_mb']}")
+    if any(result["missing"].values()) or result["errors"]:
+        print(f"⚠️ missing {result['missing']}, errors {result['errors']}")
+    print(f"📄 Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(result, json.load(f), args.max_regression)
+        if regressions:
+            print("❌ Regressions against baseline: " + "; ".join(regressions))
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+RISK_KEYS = ("self_harm", "homicidal", "psychosis", "distress")
+
+
+class RiskTracker:
+    """
+    Running per-call risk aggregate, updated one user utterance at a time.
+
+    Each metric is an exponentially decayed average that never drops below the
+    latest utterance's score, so a spike shows up immediately and fades over the
+    following calm utterances. The per-metric peak is kept alongside it and is
+    what the end-of-call report uses, so one disclosure is never averaged away.
+
+    State lives in the session store so any webhook worker can continue a call.
+    """
+
+    def __init__(self, store, decay=0.7):
+        self.store = store
+        self.decay = decay
+
+    @staticmethod
+    def _key(call_id):
+        return f"risk:{call_id}"
+
+    def update(self, call_id, scores):
+        """
+        Fold one utterance's scores in and return the running scores, or None if the
+        call has already finished. Atomic in the store, so workers scoring the same
+        call concurrently never lose an update.
+        """
+        def fold(state):
+            if state is None:
+                state = {
+                    "current": {key: 0.0 for key in RISK_KEYS},
+                    "peak": {key: 0.0 for key in RISK_KEYS},
+                    "utterances": 0,
+                }
+
+            for key in RISK_KEYS:
+                score = scores.get(key) or 0.0
+                if state["utterances"] == 0:
+                    running = score
+                else:
+                    running = max(score, self.decay * state["current"][key] + (1 - self.decay) * score)
+                state["current"][key] = running
+                state["peak"][key] = max(state["peak"][key], score)
+
+            state["utterances"] += 1
+            return state
+
+        state = self.store.update_state(self._key(call_id), fold)
+        return dict(state["current"]) if state else None
+
+    def current(self, call_id):
+        state = self.store.get_state(self._key(call_id))
+        return dict(state["current"]) if state else None
+
+    def finish(self, call_id):
+        """Drop the call's state and return its peak scores, or None if nothing was scored."""
+        state = self.store.pop_state(self._key(call_id))
+        return dict(state["peak"]) if state else None
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+
+import aiohttp
+
+from async_runtime import runtime
+from SentimentAgent.instrumentation import get_logger, metrics, span
+from SentimentAgent.result_cache import ResultCache
+
+log = get_logger("sentiment_client")
+sentiment_requests = metrics.counter("serenity_sentiment_requests_total", "Calls to the sentiment service, by outcome")
+
+# Hugging Face hosted sentiment agent (see SentimentAgent/analyze_emotions.py)
+SENTIMENT_URL = os.getenv("SENTIMENT_URL", "https://roshansanjeev-sentimentanalysis.hf.space/")
+
+# Webhook retries and repeated reports send the same transcript again; reuse the answer
+# instead of another round trip. Failed calls are not cached.
+result_cache = ResultCache(
+    max_entries=int(os.getenv("SENTIMENT_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("SENTIMENT_CACHE_TTL", "300"))
+)
+metrics.counter("serenity_sentiment_cache_hits_total", "Sentiment results served from the cache", fn=lambda: result_cache.hits)
+metrics.counter("serenity_sentiment_cache_misses_total", "Sentiment results requested from the service", fn=lambda: result_cache.misses)
+metrics.counter("serenity_sentiment_cache_coalesced_total", "Sentiment requests that joined one in flight", fn=lambda: result_cache.coalesced)
+
+
+def normalize_score(score):
+    """
+    Normalize score to 99 if it's 1 or True, and 0.0 if None. The service scores 0-100,
+    so the dashboard's percentages run 0-10000 (see risk_points).
+    """
+    if score is True or score == 1:
+        return 99
+    if score is None:
+        return 0
+    else:
+        return int(score * 100)
+
+
+def risk_points(percentage):
+    """A dashboard percentage (normalize_score) back on the service's 0-100 scale; unscored is 0."""
+    if percentage is None or percentage < 0:
+        return 0.0
+    return min(percentage / 100, 100.0)
+
+
+async def analyze_text(text, audio_url=None, priority=False):
+    """
+    Raw metrics for text from the cache or the sentiment service, or None on failure.
+    With audio_url the service also scores the call recording and returns fused metrics;
+    recordings are unique per call, so those requests skip the cache. priority requests
+    are admitted by the service even when its queue is full.
+    """
+    if audio_url:
+        return await _request_analysis(text, audio_url, priority)
+    return await result_cache.get_or_compute(text, lambda t: _request_analysis(t, priority=priority))
+
+
+async def _request_analysis(text, audio_url=None, priority=False):
+    payload = {"text": text}
+    if audio_url:
+        payload["audio_url"] = audio_url
+    if priority:
+        payload["priority"] = True
+
+    try:
+        with span("sentiment_request", audio=bool(audio_url)):
+            sentiment_analysis = await runtime.post_json(SENTIMENT_URL, payload)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        sentiment_requests.inc(outcome="error")
+        log.warning("Error calling sentiment analysis API: %s", e)
+        return None
+    except json.JSONDecodeError as e:
+        sentiment_requests.inc(outcome="bad_response")
+        log.warning("Error decoding JSON from sentiment analysis API: %s", e)
+        return None
+
+    sentiment_requests.inc(outcome="ok")
+    return sentiment_analysis
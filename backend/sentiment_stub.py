@@ -0,0 +1,70 @@
+# sentiment_stub.py - stand-in for the sentiment service (SentimentAgent/analyze_emotions.py) in load tests
+#
+#   python sentiment_stub.py --port 8100 --delay-ms 50 --jitter-ms 20
+#
+# Answers POST / after a configurable delay with scores derived from the text, so the
+# pipeline can be benchmarked without the model. Texts carrying a "[call:n]" marker (as
+# loadgen.py sends them) get scores that rise with n, so every user utterance of a call
+# raises its running risk. Utterances scored together are scored by their last marker, and
+# stub_step() reads n back from the dashboard's distress percentage.
+import argparse
+import asyncio
+import random
+import re
+
+from aiohttp import web
+
+MARKER = re.compile(r"\[\w+:(\d+)\]")
+
+
+def stub_metrics(text):
+    steps = MARKER.findall(text)
+    step = int(steps[-1]) if steps else len(text)
+    rising = min(100.0, 1.0 + 0.5 * step)
+    return {
+        "self_harm": round(rising * 0.6, 2),
+        "homicidal": round(rising * 0.2, 2),
+        "distress": rising,
+        "psychosis": round(rising * 0.1, 2)
+    }
+
+
+def stub_step(distress_percentage):
+    """The marker n behind a distress percentage the dashboard shows (inverse of stub_metrics after normalize_score)."""
+    return round((distress_percentage - 100) / 50)
+
+
+def create_app(delay_ms=50.0, jitter_ms=0.0):
+    stats = {"requests": 0}
+
+    async def analyze(request):
+        data = await request.json()
+        stats["requests"] += 1
+        delay = max(0.0, delay_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        return web.json_response(stub_metrics(data.get("text", "")))
+
+    async def health(request):
+        return web.json_response({"status": "ready", "backend": "stub", **stats})
+
+    app = web.Application()
+    app.router.add_post("/", analyze)
+    app.router.add_get("/health", health)
+    return app
+
+
+async def start_stub(port, delay_ms=50.0, jitter_ms=0.0):
+    """Serve the stub on the running loop; returns the runner to clean up with `await runner.cleanup()`."""
+    runner = web.AppRunner(create_app(delay_ms, jitter_ms), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--delay-ms", type=float, default=50.0, help="time each analysis takes")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random +/- variation of the delay")
+    args = parser.parse_args()
+    web.run_app(create_app(args.delay_ms, args.jitter_ms), host="127.0.0.1", port=args.port, access_log=None)
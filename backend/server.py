@@ -0,0 +1,20 @@
+# Single-process deployment: Vapi relay, scoring and dashboard share one in-memory event bus.
+# The Vapi webhook is served at /vapi/vapi-webhook, the dashboard endpoints stay where app2.py puts them.
+# Run it with gunicorn (settings in gunicorn.conf.py):
+#
+#   gunicorn server:app
+import os
+import sys
+
+from app2 import app, socketio
+from test import vapi
+
+app.register_blueprint(vapi, url_prefix='/vapi')
+
+if __name__ == '__main__':
+    # Flask-SocketIO refuses to serve through the Werkzeug dev server outside debug mode;
+    # ALLOW_UNSAFE_WERKZEUG=1 lets loadgen.py run it anyway. Not for deployments.
+    if os.getenv("ALLOW_UNSAFE_WERKZEUG") != "1":
+        sys.exit("Start the server with `gunicorn server:app`, or set ALLOW_UNSAFE_WERKZEUG=1 for the dev server")
+    socketio.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "5001")),
+                 allow_unsafe_werkzeug=True)
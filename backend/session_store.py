@@ -0,0 +1,391 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from call_model import Transcript, Utterance
+
+# Left in place of a popped state value for the rest of its TTL, so an update that
+# arrives after the call finished can't bring the value back. Not valid JSON.
+_TOMBSTONE = "\x00popped"
+
+
+def message_fingerprints(message):
+    """
+    Short fixed-size digests used for duplicate detection.
+
+    Returns (exact, content): exact covers role, text and Vapi timestamp and identifies
+    a message re-sent in a later speech-update; content covers role and text only and
+    catches the same utterance arriving again with a new timestamp.
+    """
+    content = f"{message['role']}\n{message['message']}"
+    exact = f"{content}\n{message.get('time')}"
+    return (
+        hashlib.blake2b(exact.encode(), digest_size=12).hexdigest(),
+        hashlib.blake2b(content.encode(), digest_size=12).hexdigest()
+    )
+
+
+class InMemorySessionStore:
+    """
+    Live call sessions for a single process.
+
+    Every session expires ttl seconds after its last activity, so calls that never
+    send end-of-call-report are evicted, and keeps at most max_messages messages and
+    the fingerprints of the last max_messages appended for dedupe.
+    Besides sessions it holds small per-call state values (e.g. risk aggregates)
+    under their own keys with the same TTL; once popped a state value stays gone
+    until its TTL runs out. Messages are kept as slotted Utterances
+    and only turned back into dicts when a session is read.
+    """
+
+    def __init__(self, ttl=3600, max_messages=1000, dedupe_window=3, sweep_interval=30):
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.dedupe_window = dedupe_window
+        self.sweep_interval = sweep_interval
+        self._sessions = {}
+        self._state = {}
+        self._expires = {}
+        self._last_sweep = time.time()
+        self._lock = threading.Lock()
+
+    def _touch(self, key):
+        self._expires[key] = time.time() + self.ttl
+
+    def _alive(self, key):
+        deadline = self._expires.get(key)
+        if deadline is None:
+            return False
+        if deadline < time.time():
+            self._drop(key)
+            return False
+        return True
+
+    def _drop(self, key):
+        self._expires.pop(key, None)
+        kind, name = key
+        if kind == "session":
+            self._sessions.pop(name, None)
+        else:
+            self._state.pop(name, None)
+
+    def _sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        for key in [key for key, deadline in self._expires.items() if deadline < now]:
+            self._drop(key)
+
+    def create(self, call_id, phone):
+        """Start a session unless one exists; returns True only for the caller that created it."""
+        with self._lock:
+            self._sweep()
+            key = ("session", call_id)
+            if self._alive(key):
+                self._touch(key)
+                return False
+            self._sessions[call_id] = {
+                "phone": phone,
+                "user_name": "Unknown",
+                "messages": Transcript(self.max_messages),
+                # Insertion-ordered, so the oldest fingerprint is the first key
+                "seen": {},
+                "recent": deque(maxlen=self.dedupe_window),
+                "start_time": time.time()
+            }
+            self._touch(key)
+            return True
+
+    def get(self, call_id):
+        with self._lock:
+            if not self._alive(("session", call_id)):
+                return None
+            return self._export(self._sessions[call_id])
+
+    def get_field(self, call_id, name):
+        """One session field without copying the messages; None once the session is gone."""
+        with self._lock:
+            if not self._alive(("session", call_id)):
+                return None
+            return self._sessions[call_id].get(name)
+
+    def set_field(self, call_id, name, value):
+        with self._lock:
+            key = ("session", call_id)
+            if self._alive(key):
+                self._sessions[call_id][name] = value
+                self._touch(key)
+
+    def append_message(self, call_id, message):
+        """
+        Append a message unless it was already stored for this call or repeats one of the
+        last dedupe_window messages; returns True if appended. O(1) whatever the call length.
+        """
+        exact, content = message_fingerprints(message)
+        with self._lock:
+            key = ("session", call_id)
+            if not self._alive(key):
+                return False
+            session = self._sessions[call_id]
+            if exact in session["seen"] or content in session["recent"]:
+                return False
+            session["messages"].append(Utterance.from_dict(message))
+            seen = session["seen"]
+            seen[exact] = None
+            if len(seen) > self.max_messages:
+                del seen[next(iter(seen))]
+            session["recent"].append(content)
+            self._touch(key)
+            return True
+
+    def pop(self, call_id):
+        """Remove and return a session; concurrent callers get it at most once."""
+        with self._lock:
+            key = ("session", call_id)
+            if not self._alive(key):
+                return None
+            session = self._sessions[call_id]
+            self._drop(key)
+            return self._export(session)
+
+    def _state_value(self, name):
+        if not self._alive(("state", name)) or self._state[name] == _TOMBSTONE:
+            return None
+        return json.loads(self._state[name])
+
+    def get_state(self, name):
+        with self._lock:
+            return self._state_value(name)
+
+    def put_state(self, name, value):
+        with self._lock:
+            self._state[name] = json.dumps(value)
+            self._touch(("state", name))
+
+    def update_state(self, name, update):
+        """
+        Atomically replace a state value with update(value) (value is None if there is
+        none yet) and return the new value. Returns None without calling update once the
+        value has been popped.
+        """
+        with self._lock:
+            key = ("state", name)
+            if self._alive(key) and self._state[name] == _TOMBSTONE:
+                return None
+            value = update(self._state_value(name))
+            self._state[name] = json.dumps(value)
+            self._touch(key)
+            return value
+
+    def pop_state(self, name):
+        with self._lock:
+            key = ("state", name)
+            value = self._state_value(name)
+            self._state[name] = _TOMBSTONE
+            self._touch(key)
+            return value
+
+    def active_count(self):
+        with self._lock:
+            self._sweep()
+            return len(self._sessions)
+
+    @staticmethod
+    def _export(session):
+        data = {k: v for k, v in session.items() if k not in ("seen", "recent")}
+        data["messages"] = session["messages"].to_dicts()
+        return data
+
+
+# Redis scripts keep each read-check-write step atomic across webhook workers.
+# KEYS[5] is the index of live sessions, scored by when each one expires.
+_CREATE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[5], '-inf', ARGV[3])
+redis.call('ZADD', KEYS[5], ARGV[4], ARGV[5])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    for i = 1, 4 do redis.call('EXPIRE', KEYS[i], ARGV[1]) end
+    return 0
+end
+redis.call('HSET', KEYS[1], 'phone', ARGV[2], 'user_name', 'Unknown', 'start_time', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+
+_APPEND_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if redis.call('ZSCORE', KEYS[4], ARGV[4]) then
+    return 0
+end
+local recent = redis.call('LRANGE', KEYS[3], 0, -1)
+for _, fingerprint in ipairs(recent) do
+    if fingerprint == ARGV[5] then
+        return 0
+    end
+end
+redis.call('RPUSH', KEYS[2], ARGV[6])
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+-- Fingerprints are scored by append order and trimmed to the same max_messages
+local appended = redis.call('HINCRBY', KEYS[1], 'appended', 1)
+redis.call('ZADD', KEYS[4], appended, ARGV[4])
+redis.call('ZREMRANGEBYRANK', KEYS[4], 0, -tonumber(ARGV[2]) - 1)
+redis.call('RPUSH', KEYS[3], ARGV[5])
+redis.call('LTRIM', KEYS[3], -tonumber(ARGV[3]), -1)
+for i = 1, 4 do redis.call('EXPIRE', KEYS[i], ARGV[1]) end
+redis.call('ZADD', KEYS[5], ARGV[7], ARGV[8])
+return 1
+"""
+
+_SET_FIELD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+    for i = 1, 4 do redis.call('EXPIRE', KEYS[i], ARGV[1]) end
+    redis.call('ZADD', KEYS[5], ARGV[4], ARGV[5])
+end
+return 0
+"""
+
+
+class RedisSessionStore:
+    """
+    Session store shared by every webhook worker, backed by a Redis-compatible server.
+
+    Same interface and semantics as InMemorySessionStore. Expiry is Redis key TTL,
+    so abandoned calls disappear without a sweeper. Any redis-py compatible client
+    created with decode_responses=True works, including fakeredis.FakeRedis.
+
+    A session is a hash plus three keys: the messages list, the recent content
+    fingerprints list and a sorted set of message fingerprints in append order,
+    trimmed to max_messages like the messages. A sorted set of call ids scored by
+    expiry time, kept up to date by the same scripts, counts the live sessions.
+    """
+
+    def __init__(self, client, ttl=3600, max_messages=1000, dedupe_window=3, prefix="serenity:"):
+        self.client = client
+        self.ttl = ttl
+        self.max_messages = max_messages
+        self.dedupe_window = dedupe_window
+        self.prefix = prefix
+        self._create = client.register_script(_CREATE_SCRIPT)
+        self._append = client.register_script(_APPEND_SCRIPT)
+        self._set_field = client.register_script(_SET_FIELD_SCRIPT)
+        self._index_key = f"{prefix}sessions"
+
+    def _keys(self, call_id):
+        base = f"{self.prefix}session:{call_id}"
+        return [base, base + ":messages", base + ":recent", base + ":fingerprints"]
+
+    def _script_keys(self, call_id):
+        return self._keys(call_id) + [self._index_key]
+
+    def _state_key(self, name):
+        return f"{self.prefix}state:{name}"
+
+    def create(self, call_id, phone):
+        now = time.time()
+        args = [self.ttl, phone, now, now + self.ttl, call_id]
+        return self._create(keys=self._script_keys(call_id), args=args) == 1
+
+    def get(self, call_id):
+        keys = self._keys(call_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hgetall(keys[0])
+        pipe.lrange(keys[1], 0, -1)
+        fields, messages = pipe.execute()
+        return self._export(fields, messages)
+
+    def get_field(self, call_id, name):
+        return self.client.hget(self._keys(call_id)[0], name)
+
+    def set_field(self, call_id, name, value):
+        args = [self.ttl, name, value, time.time() + self.ttl, call_id]
+        self._set_field(keys=self._script_keys(call_id), args=args)
+
+    def append_message(self, call_id, message):
+        exact, content = message_fingerprints(message)
+        args = [
+            self.ttl, self.max_messages, self.dedupe_window, exact, content, json.dumps(message),
+            time.time() + self.ttl, call_id
+        ]
+        return self._append(keys=self._script_keys(call_id), args=args) == 1
+
+    def pop(self, call_id):
+        keys = self._keys(call_id)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hgetall(keys[0])
+        pipe.lrange(keys[1], 0, -1)
+        pipe.delete(*keys)
+        pipe.zrem(self._index_key, call_id)
+        fields, messages, deleted, _ = pipe.execute()
+        # Only the worker whose DEL actually removed the session gets it back
+        if not deleted:
+            return None
+        return self._export(fields, messages)
+
+    @staticmethod
+    def _state_value(raw):
+        return json.loads(raw) if raw is not None and raw != _TOMBSTONE else None
+
+    def get_state(self, name):
+        return self._state_value(self.client.get(self._state_key(name)))
+
+    def put_state(self, name, value):
+        self.client.set(self._state_key(name), json.dumps(value), ex=self.ttl)
+
+    def update_state(self, name, update):
+        """update(value) applied with WATCH/MULTI, retried if another worker wrote the key meanwhile."""
+        key = self._state_key(name)
+        result = {}
+
+        def apply(pipe):
+            raw = pipe.get(key)
+            result["value"] = None if raw == _TOMBSTONE else update(self._state_value(raw))
+            pipe.multi()
+            if raw != _TOMBSTONE:
+                pipe.set(key, json.dumps(result["value"]), ex=self.ttl)
+
+        self.client.transaction(apply, key)
+        return result["value"]
+
+    def pop_state(self, name):
+        key = self._state_key(name)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(key)
+        pipe.set(key, _TOMBSTONE, ex=self.ttl)
+        raw, _ = pipe.execute()
+        return self._state_value(raw)
+
+    def active_count(self):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zremrangebyscore(self._index_key, "-inf", time.time())
+        pipe.zcard(self._index_key)
+        return pipe.execute()[1]
+
+    @staticmethod
+    def _export(fields, messages):
+        if not fields:
+            return None
+        return {
+            "phone": fields.get("phone"),
+            "user_name": fields.get("user_name", "Unknown"),
+            "start_time": float(fields.get("start_time", 0)),
+            "messages": [json.loads(m) for m in messages]
+        }
+
+
+def create_session_store():
+    """Pick the backend from SESSION_STORE_URL: a redis:// URL for a shared store, unset for in-memory."""
+    ttl = int(os.getenv("SESSION_TTL", "3600"))
+    max_messages = int(os.getenv("SESSION_MAX_MESSAGES", "1000"))
+    url = os.getenv("SESSION_STORE_URL")
+
+    if url:
+        import redis
+        client = redis.Redis.from_url(url, decode_responses=True)
+        return RedisSessionStore(client, ttl=ttl, max_messages=max_messages)
+    return InMemorySessionStore(ttl=ttl, max_messages=max_messages)
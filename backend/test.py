@@ -1,21 +1,89 @@
-from flask import Flask, request
+from flask import Blueprint, Flask, Response, jsonify, request
 import json
+import os
 import time
-import re
-import requests
 
-app = Flask(__name__)
-
-# Global in-memory dictionary to store session data per call_id
-live_sessions = {}
-
-@app.route('/vapi-webhook', methods=['POST'])
+from SentimentAgent.instrumentation import PROMETHEUS_CONTENT_TYPE, get_logger, metrics, span
+from SentimentAgent.phrase_matcher import Lexicon
+from backpressure import CallScorer, pipeline_status, register_source
+from call_model import Transcript, Utterance
+from event_bus import CallReport, HttpTransport, LiveTranscriptUpdate, NewCall, RiskAssessmentUpdate, bus
+from risk_tracker import RiskTracker
+from sentiment_client import analyze_text
+from serialization import FastJSONProvider
+from session_store import create_session_store
+
+# Vapi webhook, mounted on its own app below or next to the dashboard in server.py
+vapi = Blueprint('vapi', __name__)
+
+DASHBOARD_URL = "http://localhost:5001"
+
+# Live session data per call_id, in memory or shared between workers (see session_store.py)
+live_sessions = create_session_store()
+
+# Running per-call risk scores, updated on every new user utterance
+risk_tracker = RiskTracker(live_sessions)
+
+log = get_logger("vapi")
+webhooks_received = metrics.counter("serenity_webhooks_total", "Vapi webhooks received, by message type")
+messages_appended = metrics.counter("serenity_messages_appended_total", "New transcript messages, by role")
+duplicates_skipped = metrics.counter("serenity_duplicate_messages_total", "Re-sent transcript messages dropped by dedupe")
+metrics.gauge("serenity_active_sessions", "Calls with a live session", fn=lambda: live_sessions.active_count())
+
+# Name cues come from the same hot-reloaded lexicon the sentiment service uses for risk phrases
+lexicon = Lexicon(os.getenv(
+    "LEXICON_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "SentimentAgent", "risk_lexicon.json")
+))
+
+
+async def score_utterance(call_id, content, priority=False):
+    scores = await analyze_text(content, priority=priority)
+    if not scores:
+        return False
+    aggregate = risk_tracker.update(call_id, scores)
+    # None: the call's final report has already taken its scores
+    if aggregate is not None:
+        bus.publish(RiskAssessmentUpdate(call_id=call_id, scores=aggregate))
+    return True
+
+
+# One scoring request per call at a time; utterances arriving meanwhile are scored together
+scorer = CallScorer(
+    score_utterance,
+    max_concurrency=int(os.getenv("SCORING_CONCURRENCY", "8")),
+    max_waiting=int(os.getenv("SCORING_MAX_WAITING", "200")),
+    max_text_chars=int(os.getenv("SCORING_MAX_TEXT_CHARS", "8000"))
+)
+register_source("scoring", scorer.status)
+metrics.gauge("serenity_scoring_waiting", "Calls waiting for a scoring slot", fn=lambda: scorer.waiting)
+metrics.counter("serenity_scoring_coalesced_total", "Utterances merged into another scoring request", fn=lambda: scorer.coalesced)
+metrics.counter("serenity_scoring_failed_total", "Utterances left to the end-of-call analysis", fn=lambda: scorer.failed)
+
+
+async def send_final_report(report):
+    # Reuse the scores accumulated during the call instead of re-analyzing the transcript.
+    # Runs after the call's pending utterance scoring, so every utterance is counted. If
+    # some were never scored the peaks may miss them and the dashboard analyzes the call.
+    report.risk_scores = risk_tracker.finish(report.call_id)
+    unscored = scorer.pop_failures(report.call_id)
+    if unscored:
+        report.scores_incomplete = True
+        log.warning("⚠️ %d utterances of call %s were not scored live, requesting a full analysis", unscored, report.call_id)
+
+    log.info("📤 Publishing final report for call %s", report.call_id)
+    bus.publish(report)
+
+
+@vapi.route('/vapi-webhook', methods=['POST'])
 def handle_webhook():
-    data = request.json
-    message = data.get("message", {})
-    msg_type = message.get("type")
-    call_info = message.get("call", {})
-    call_id = call_info.get("id")
+    with span("webhook_parse"):
+        data = request.json
+        message = data.get("message", {})
+        msg_type = message.get("type")
+        call_info = message.get("call", {})
+        call_id = call_info.get("id")
+    webhooks_received.inc(type=msg_type or "unknown")
 
     if msg_type == "speech-update":
         artifact = message.get("artifact", {})
@@ -23,37 +91,18 @@ def handle_webhook():
         user_phone = message.get("customer", {}).get("number", "Unknown")
 
         if call_id:
-            is_new_session = False
-
-            # Initialize session if new
-            if call_id not in live_sessions:
-                live_sessions[call_id] = {
-                    "phone": user_phone,
-                    "user_name": "Unknown",
-                    "messages": [],
-                    "start_time": time.time()
-                }
-                is_new_session = True
+            # Initialize session if new; only one worker wins the create for a call
+            is_new_session = live_sessions.create(call_id, user_phone)
+            # Only the name is needed here; reading the whole session would copy every message per webhook
+            user_name = live_sessions.get_field(call_id, "user_name")
+            if user_name is None:
+                # Ended (or expired) between the two calls
+                return '', 200
 
             # ✅ On first speech-update, trigger a new_call to dashboard
             if is_new_session:
-                init_data = {
-                    "id": int(time.time()),  # fallback ID
-                    "user_phone": user_phone,
-                    "user_name": "Unknown",
-                    "call_duration": "0.0",
-                    "call_transcript": "",
-                    "summary": "Call in progress..."
-                }
-                try:
-                    requests.post("http://localhost:5001/vapi-webhook", json=init_data)
-                    print("📤 Initial new_call sent to output server")
-                except Exception as e:
-                    print(f"❌ Failed to send initial new_call: {e}")
-
-            # Show elapsed call time
-            elapsed = time.time() - live_sessions[call_id]["start_time"]
-            print(f"📞 Live message from: {user_phone} | ⏱️ Elapsed time: {elapsed:.1f} seconds")
+                log.info("📞 New call %s from %s", call_id, user_phone)
+                bus.publish(NewCall(call_id=call_id, user_phone=user_phone))
 
             for m in messages:
                 role = m.get("role")
@@ -63,112 +112,85 @@ def handle_webhook():
                 content = m.get("message")
                 timestamp = m.get("time")
 
-                print(f"{role.capitalize()}: {content} (at {timestamp})")
-
                 msg_obj = {
                     "role": role,
                     "message": content,
                     "time": timestamp
                 }
 
-                prev_messages = live_sessions[call_id]["messages"]
-                recent_messages = prev_messages[-3:] if len(prev_messages) >= 3 else prev_messages
-
-                is_duplicate = any(
-                    msg["message"] == content and msg["role"] == role
-                    for msg in recent_messages
-                )
-
-                if not is_duplicate:
-                    live_sessions[call_id]["messages"].append(msg_obj)
-
-                    if len(prev_messages) == 0:
-                        new_call_data = {
-                            "id": int(time.time()),
-                            "user_phone": user_phone,
-                            "user_name": live_sessions[call_id]["user_name"],
-                            "call_duration": "0.0",
-                            "call_transcript": "",
-                            "summary": "Call in progress..."
-                        }
-                        try:
-                            requests.post("http://localhost:5001/vapi-webhook", json=new_call_data)
-                            print("📤 New call POSTED to dashboard (from test.py)")
-                        except Exception as e:
-                            print(f"❌ Failed to POST new call: {e}")
-
-                    # 🧠 Name extraction from user input
-                    if role == "user" and live_sessions[call_id]["user_name"] == "Unknown":
-                        match = re.search(r"\b(my name is|i am|i'm)\s+([A-Z][a-z]+)", content, re.IGNORECASE)
-                        if match:
-                            name = match.group(2).capitalize()
-                            live_sessions[call_id]["user_name"] = name
-                            print(f"👤 Captured user name: {name}")
-
-                    # 🤖 Name extraction from bot
-                    if role == "bot" and live_sessions[call_id]["user_name"] == "Unknown":
-                        match = re.search(
-                            r"(?:nice to meet you|thank you for sharing that|it's good to meet you|it's okay to take your time),?\s+([A-Z][a-z]+)",
-                            content,
-                            re.IGNORECASE
-                        )
-                        if match:
-                            name = match.group(1).capitalize()
-                            live_sessions[call_id]["user_name"] = name
-                            print(f"🤖 Captured user name from assistant reply: {name}")
-
-                    live_data = {
-                        "call_id": call_id,
-                        "user_phone": user_phone,
-                        "user_name": live_sessions[call_id]["user_name"],
-                        "role": role,
-                        "message": content,
-                        "timestamp": timestamp
-                    }
-
-                    try:
-                        requests.post("http://localhost:5001/live-update", json=live_data)
-                        print(f"📤 Live update sent: {live_data}")
-                    except Exception as e:
-                        print(f"❌ Failed to send live update: {e}")
+                # Appends atomically unless it repeats one of the last few messages
+                with span("dedupe"):
+                    appended = live_sessions.append_message(call_id, msg_obj)
+                if appended:
+                    messages_appended.inc(role=role)
+                    # 🧠 Name extraction from user input ("my name is ...") or the bot's reply ("nice to meet you, ...")
+                    if role in ("user", "bot") and user_name == "Unknown":
+                        with span("name_extraction"):
+                            name = lexicon.matcher.extract_name(content, role)
+                        if name:
+                            user_name = name
+                            live_sessions.set_field(call_id, "user_name", user_name)
+                            log.info("👤 Captured user name for call %s from %s", call_id, role)
+
+                    bus.publish(LiveTranscriptUpdate(
+                        call_id=call_id,
+                        user_phone=user_phone,
+                        user_name=user_name,
+                        role=role,
+                        message=content,
+                        timestamp=timestamp
+                    ))
+
+                    # 📈 Score the new utterance in the background and push the running risk aggregate
+                    if role == "user":
+                        scorer.add(call_id, content)
                 else:
-                    print(f"⚠️ Duplicate skipped: {role}: {content}")
+                    duplicates_skipped.inc()
 
     elif msg_type == "end-of-call-report":
-        session = live_sessions.get(call_id)
+        # pop() is atomic, so a retried report is only forwarded once
+        session = live_sessions.pop(call_id)
         if session:
-            print(f"\n📞 Final transcript for {session.get('user_name', 'Unknown')} ({session['phone']}):")
-            transcript_lines = []
-            for m in session["messages"]:
-                line = f"{m['role'].capitalize()}: {m['message']}"
-                transcript_lines.append(line)
-                print(line)
-
+            transcript = Transcript()
+            transcript.extend(Utterance.from_dict(m) for m in session["messages"])
             duration = time.time() - session["start_time"]
-            print(f"\n⏱️ Total call duration: {duration:.1f} seconds")
-
             summary = message.get("analysis", {}).get("summary", "")
-            print("\n🧠 Summary:")
-            print(summary)
-
-            call_data = {
-                "user_phone": session["phone"],
-                "user_name": session["user_name"],
-                "call_duration": f"{duration:.1f}",
-                "call_transcript": "\n".join(transcript_lines),
-                "summary": summary
-            }
-
-            try:
-                print("📤 Sending final call data to output server...")
-                response = requests.post("http://localhost:5001/vapi-webhook", json=call_data)
-                print(f"✅ Response from output server: {response.status_code} {response.text}")
-            except Exception as e:
-                print(f"❌ Failed to send final call data: {e}")
-
-            del live_sessions[call_id]
+            log.info("📞 Call %s ended after %.1f seconds, %d messages", call_id, duration, len(transcript))
+
+            report = CallReport(
+                call_id=call_id,
+                user_phone=session["phone"],
+                user_name=session["user_name"],
+                call_duration=f"{duration:.1f}",
+                call_transcript=transcript.text(),
+                summary=summary,
+                recording_url=message.get("recordingUrl") or message.get("artifact", {}).get("recordingUrl")
+            )
+
+            scorer.after(call_id, send_final_report(report))
 
     return '', 200
 
+
+@vapi.route('/pipeline-status', methods=['GET'])
+def handle_pipeline_status():
+    return jsonify(pipeline_status()), 200
+
+
+@vapi.route('/metrics', methods=['GET'])
+def handle_metrics():
+    return Response(metrics.render(), mimetype=PROMETHEUS_CONTENT_TYPE)
+
+app = Flask(__name__)
+# Speech-updates carry the whole transcript so far; parse them with the fast decoder
+app.json = FastJSONProvider(app)
+app.register_blueprint(vapi)
+
 if __name__ == '__main__':
+    # Standalone relay: events go over HTTP to the dashboard server (app2.py)
+    bus.use_transport(HttpTransport(
+        os.getenv("EVENT_BUS_URL", DASHBOARD_URL + "/events"),
+        retry_seconds=float(os.getenv("RELAY_RETRY_SECONDS", "60")),
+        call_retry_seconds=float(os.getenv("RELAY_CALL_RETRY_SECONDS", "600"))
+    ))
     app.run(port=5002)
@@ -37,7 +37,7 @@ def on_frontend_update(data):
 def test_websocket():
     try:
         # Connect to the Flask-SocketIO server
-        sio.connect('http://localhost:5000')
+        sio.connect('http://localhost:5001')
         
         # Send a ping to test connection
         sio.emit('ping', {'message': 'Hello from test client'})
@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+
+from async_runtime import runtime
+from backpressure import BroadcastQueue, CallScorer
+
+
+class FakeSocketIO:
+    def start_background_task(self, target):
+        # The tests drain the queue themselves through _next()
+        return object()
+
+
+class FakeBroadcaster:
+    def __init__(self):
+        self.socketio = FakeSocketIO()
+        self.updates = []
+
+    def update(self, call_id, fields, chunk=None, chunks=None, emit=True):
+        self.updates.append((call_id, dict(fields), list(chunks or []), emit))
+
+
+def drain(queue):
+    sent = []
+    while queue.pending():
+        call_id, entry = queue._next()
+        sent.append((call_id, entry))
+    return sent
+
+
+def test_normal_updates_are_coalesced():
+    queue = BroadcastQueue(FakeBroadcaster())
+    queue.submit(1, {"distress_percentage": 1000.0}, chunk="a")
+    queue.submit(1, {"distress_percentage": 2000.0}, chunk="b")
+    queue.submit(2, {"user_name": "Sam"})
+
+    sent = drain(queue)
+    assert [call_id for call_id, _ in sent] == [1, 2]
+    assert sent[0][1]["fields"] == {"distress_percentage": 2000.0}
+    assert sent[0][1]["chunks"] == ["a", "b"]
+    assert queue.coalesced == 1
+
+
+def test_urgent_updates_go_first():
+    queue = BroadcastQueue(FakeBroadcaster())
+    queue.submit(1, {"distress_percentage": 1000.0})
+    queue.submit(2, {"distress_percentage": 1000.0})
+    queue.submit(3, {"self_harm_percentage": 9000.0}, urgent=True)
+    # An urgent change to a call already waiting in the normal lane promotes it
+    queue.submit(2, {"self_harm_percentage": 9500.0}, urgent=True)
+
+    sent = drain(queue)
+    assert [call_id for call_id, _ in sent] == [3, 2, 1]
+    assert sent[1][1]["fields"] == {"distress_percentage": 1000.0, "self_harm_percentage": 9500.0}
+
+
+def test_full_queue_applies_normal_updates_without_emitting():
+    broadcaster = FakeBroadcaster()
+    queue = BroadcastQueue(broadcaster, max_pending=1)
+    assert queue.submit(1, {"distress_percentage": 1000.0})
+    assert not queue.submit(2, {"distress_percentage": 1000.0})
+    # Urgent updates are always queued
+    assert queue.submit(3, {"self_harm_percentage": 9000.0}, urgent=True)
+
+    assert broadcaster.updates == [(2, {"distress_percentage": 1000.0}, [], False)]
+    assert queue.overflowed == 1
+    assert [call_id for call_id, _ in drain(queue)] == [3, 1]
+
+
+# CallScorer runs on the shared async runtime, like in the servers
+
+class RecordingScoreFn:
+    """Records scored texts; with a gate, every request waits until it is opened."""
+
+    def __init__(self, results=None, gated=False):
+        self.events = []
+        self.results = results
+        self.gate = None
+        self.gated = gated
+
+    async def __call__(self, call_id, text, priority):
+        if self.gated:
+            if self.gate is None:
+                self.gate = asyncio.Event()
+            await self.gate.wait()
+        self.events.append(("score", call_id, text, priority))
+        return self.results.pop(0) if self.results else True
+
+    def open(self):
+        runtime.call_soon(lambda: self.gate.set() if self.gate else setattr(self, "gated", False))
+
+
+def after_done(scorer, call_id, events):
+    """after() for the call, blocking until its coroutine has run."""
+    done = threading.Event()
+
+    async def record():
+        events.append(("after", call_id))
+        done.set()
+
+    scorer.after(call_id, record())
+    return done
+
+
+def on_runtime(fn):
+    async def call():
+        return fn()
+    return runtime.submit(call()).result(5)
+
+
+def occupy(scorer, call_id="busy"):
+    """Queue a call and wait until it holds the only request slot."""
+    scorer.add(call_id, "hold")
+    deadline = time.time() + 5
+    while not on_runtime(lambda: scorer.in_flight == 1):
+        assert time.time() < deadline
+        time.sleep(0.001)
+
+
+def test_after_runs_once_queued_text_is_scored():
+    score_fn = RecordingScoreFn(gated=True)
+    scorer = CallScorer(score_fn, max_concurrency=1)
+    occupy(scorer)
+    scorer.add("c1", "first")
+    scorer.add("c1", "second")
+    done = after_done(scorer, "c1", score_fn.events)
+    # A call with nothing queued runs its after() right away
+    assert after_done(scorer, "c2", score_fn.events).wait(5)
+
+    score_fn.open()
+    assert done.wait(5)
+    assert score_fn.events == [
+        ("after", "c2"),
+        ("score", "busy", "hold", False),
+        # Text that arrived while the call waited is scored in one request
+        ("score", "c1", "first\nsecond", False),
+        ("after", "c1"),
+    ]
+    assert scorer.coalesced == 1
+
+
+def test_failed_scoring_is_retried_on_the_priority_lane_then_counted():
+    score_fn = RecordingScoreFn(results=[False, False, False])
+    scorer = CallScorer(score_fn, retries=2, retry_delay=0)
+    scorer.add("c1", "hello")
+    assert after_done(scorer, "c1", score_fn.events).wait(5)
+
+    assert [event[3] for event in score_fn.events if event[0] == "score"] == [False, True, True]
+    assert on_runtime(lambda: scorer.pop_failures("c1")) == 1
+    assert on_runtime(lambda: scorer.pop_failures("c1")) == 0
+
+
+def test_backlog_limits():
+    score_fn = RecordingScoreFn(gated=True)
+    scorer = CallScorer(score_fn, max_concurrency=1, max_waiting=1, max_text_chars=10)
+    occupy(scorer)
+    scorer.add("c1", "0123456789")
+    # The newest text is kept when the call's waiting text gets too long
+    scorer.add("c1", "abcdefghij")
+    # No room for another call's text
+    scorer.add("c2", "hello")
+    done = after_done(scorer, "c1", score_fn.events)
+
+    score_fn.open()
+    assert done.wait(5)
+    assert ("score", "c1", "abcdefghij", False) in score_fn.events
+    assert on_runtime(lambda: scorer.pop_failures("c1")) == 1
+    assert on_runtime(lambda: scorer.pop_failures("c2")) == 1
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from SentimentAgent.batcher import MicroBatcher, Overloaded
+
+
+class GatedBatchFn:
+    """Records every batch; when gated, each one waits until the gate is set."""
+
+    def __init__(self, gated=False):
+        self.batches = []
+        self.gate = asyncio.Event()
+        if not gated:
+            self.gate.set()
+
+    async def run(self, items):
+        self.batches.append(list(items))
+        await self.gate.wait()
+        return [item.upper() for item in items]
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_requests_share_a_batch():
+    async def run():
+        batch_fn = GatedBatchFn()
+        batcher = MicroBatcher(batch_fn.run, max_batch_size=4, max_wait_ms=50)
+        results = await asyncio.gather(*(batcher.submit(text) for text in "abcde"))
+        await batcher.stop()
+        return batch_fn.batches, results, batcher.stats.snapshot()
+
+    batches, results, stats = asyncio.run(run())
+    assert results == list("ABCDE")
+    assert batches == [list("abcd"), ["e"]]
+    assert stats["batches"] == 2 and stats["requests"] == 5
+
+
+def test_plain_batch_fn_runs_in_executor():
+    async def run():
+        batcher = MicroBatcher(lambda items: [len(item) for item in items], max_wait_ms=1)
+        results = await asyncio.gather(batcher.submit("ab"), batcher.submit("abc"))
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(run()) == [2, 3]
+
+
+def test_priority_items_jump_the_queue():
+    async def run():
+        batch_fn = GatedBatchFn(gated=True)
+        batcher = MicroBatcher(batch_fn.run, max_batch_size=1, max_wait_ms=0)
+        tasks = [asyncio.ensure_future(batcher.submit("first"))]
+        await settle()
+        # "first" is being processed; everything else waits for the gate
+        tasks += [asyncio.ensure_future(batcher.submit(text)) for text in ("b", "c")]
+        tasks.append(asyncio.ensure_future(batcher.submit("urgent", priority=True)))
+        await settle()
+        batch_fn.gate.set()
+        await asyncio.gather(*tasks)
+        await batcher.stop()
+        return batch_fn.batches
+
+    assert asyncio.run(run()) == [["first"], ["urgent"], ["b"], ["c"]]
+
+
+def test_full_queue_rejects_normal_requests_only():
+    async def run():
+        batch_fn = GatedBatchFn(gated=True)
+        batcher = MicroBatcher(batch_fn.run, max_batch_size=1, max_wait_ms=0, max_queue=1)
+        running = asyncio.ensure_future(batcher.submit("running"))
+        await settle()
+        waiting = asyncio.ensure_future(batcher.submit("waiting"))
+        await settle()
+        assert batcher.fill() == 1.0
+
+        with pytest.raises(Overloaded):
+            await batcher.submit("rejected")
+        urgent = asyncio.ensure_future(batcher.submit("urgent", priority=True))
+        await settle()
+
+        batch_fn.gate.set()
+        results = await asyncio.gather(running, waiting, urgent)
+        await batcher.stop()
+        return results, batcher.stats.rejected, batcher.fill()
+
+    results, rejected, fill = asyncio.run(run())
+    assert results == ["RUNNING", "WAITING", "URGENT"]
+    assert rejected == 1
+    assert fill == 0.0
+
+
+def test_failed_batch_fails_its_requests():
+    async def run():
+        async def broken(items):
+            raise RuntimeError("model crashed")
+
+        batcher = MicroBatcher(broken, max_wait_ms=10)
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+        await batcher.stop()
+        return results, batcher.stats.failed_batches
+
+    results, failed_batches = asyncio.run(run())
+    assert [str(result) for result in results] == ["model crashed", "model crashed"]
+    assert failed_batches == 1
@@ -0,0 +1,49 @@
+# Calls that never send their end-of-call report must not stay on the dashboard or in
+# the triage queue. Needs the dashboard's dependencies (pip install -r requirements.txt).
+import time
+
+import pytest
+
+pytest.importorskip("flask_socketio")
+
+
+@pytest.fixture(scope="module")
+def app2(tmp_path_factory):
+    mp = pytest.MonkeyPatch()
+    mp.setenv("CALL_STORE_PATH", str(tmp_path_factory.mktemp("calls") / "calls.db"))
+    import app2
+    yield app2
+    mp.undo()
+
+
+def start_call(app2, vapi_call_id):
+    return app2.publish_call({"call_id": vapi_call_id, "status": "in-progress", "call_transcript": ""})
+
+
+def test_idle_call_expires(app2):
+    ghost = start_call(app2, "ghost")
+    live = start_call(app2, "live")
+    app2.last_activity["ghost"] -= app2.CALL_IDLE_TIMEOUT + 1
+
+    assert app2.expire_idle_calls() == [ghost]
+    assert ghost.status == "timed-out"
+    assert "ghost" not in app2.active_calls
+    assert ghost.id not in app2.triage_queue
+    assert "live" in app2.active_calls
+    assert live.id in app2.triage_queue
+
+    # The broadcaster forgets the call once the final status has gone out
+    deadline = time.time() + 5
+    while ghost.id in app2.broadcaster.calls and time.time() < deadline:
+        time.sleep(0.01)
+    assert ghost.id not in app2.broadcaster.calls
+    assert live.id in app2.broadcaster.calls
+
+
+def test_final_report_wins_over_expiry(app2):
+    call = start_call(app2, "finishing")
+    app2.last_activity["finishing"] -= app2.CALL_IDLE_TIMEOUT + 1
+    app2.publish_call({"call_id": "finishing", "status": "ended", "call_transcript": "", "risk_scores": {"distress": 0.1}})
+
+    assert app2.expire_idle_calls() == []
+    assert call.id not in app2.triage_queue
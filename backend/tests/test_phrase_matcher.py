@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from SentimentAgent.phrase_matcher import Lexicon, PhraseMatcher
+
+LEXICON_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SentimentAgent", "risk_lexicon.json")
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return Lexicon(LEXICON_PATH).matcher
+
+
+def categories(matcher, text):
+    return [hit.category for hit in matcher.find_all(text)]
+
+
+@pytest.mark.parametrize("text", [
+    "I overdosed yesterday",
+    "thinking about an overdose",
+    "he died last week",
+    "I feel like I'm dying",
+    "I want to kill myself",
+    "I've been having suicidal thoughts",
+    "I thought about suicide",
+])
+def test_self_harm_inflections(matcher, text):
+    assert "self_harm" in categories(matcher, text)
+
+
+def test_whole_words_only(matcher):
+    assert categories(matcher, "we are on a diet") == []
+    assert categories(matcher, "the pillows are soft") == []
+
+
+def test_overlapping_hits_longest_first():
+    matcher = PhraseMatcher([
+        {"phrase": "kill", "category": "a"},
+        {"phrase": "kill myself", "category": "b"},
+        {"phrase": "myself", "category": "c"},
+    ])
+    hits = matcher.find_all("I could  Kill\nmyself")
+    assert [(hit.phrase, hit.start) for hit in hits] == [("kill myself", 9), ("kill", 9), ("myself", 14)]
+
+
+def test_prefix_hit_covers_the_word():
+    matcher = PhraseMatcher([{"phrase": "overdos", "category": "self_harm", "prefix": True}])
+    text = "she overdosed."
+    (hit,) = matcher.find_all(text)
+    assert text[hit.start:hit.end] == "overdosed"
+
+
+@pytest.mark.parametrize("text, role, name", [
+    ("My name is sam", "user", "Sam"),
+    ("Hi, I’m Alex and I need help", "user", "Alex"),
+    ("Nice to meet you, Jordan", "bot", "Jordan"),
+    ("I am feeling down", "user", None),
+    ("I'm so tired, my name is Riley", "user", "Riley"),
+    ("I'm not me anymore", "user", None),
+    ("My name is Sam", "bot", None),
+])
+def test_extract_name(matcher, text, role, name):
+    assert matcher.extract_name(text, role) == name
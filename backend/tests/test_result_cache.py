@@ -0,0 +1,82 @@
+import asyncio
+
+from SentimentAgent import result_cache
+from SentimentAgent.result_cache import ResultCache, text_key
+
+
+def test_text_key_ignores_case_and_whitespace():
+    assert text_key("I can’t  sleep\n") == text_key("i can't sleep")
+    assert text_key("I can't sleep") != text_key("I can sleep")
+
+
+def test_lru_eviction():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    # "b" was the least recently used
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+
+def test_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    cache = ResultCache(ttl=60)
+    cache.put("a", 1)
+
+    now[0] += 59
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+
+
+def test_none_is_not_cached():
+    cache = ResultCache()
+    cache.put("a", None)
+    assert len(cache) == 0
+
+
+def test_concurrent_requests_share_one_compute():
+    calls = []
+
+    async def run():
+        cache = ResultCache()
+        release = asyncio.Event()
+
+        async def compute(text):
+            calls.append(text)
+            await release.wait()
+            return {"text": text}
+
+        waiters = [asyncio.ensure_future(cache.get_or_compute(text, compute)) for text in ("Hello", "hello ", "HELLO")]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters)
+        # Later requests are plain hits
+        again = await cache.get_or_compute("hello", compute)
+        return cache, results, again
+
+    cache, results, again = asyncio.run(run())
+    assert calls == ["Hello"]
+    assert results == [{"text": "Hello"}] * 3
+    assert again is results[0]
+    assert (cache.misses, cache.coalesced, cache.hits) == (1, 2, 1)
+
+
+def test_failed_compute_is_retried():
+    async def run():
+        cache = ResultCache()
+        outcomes = iter([None, "ok"])
+
+        async def compute(text):
+            return next(outcomes)
+
+        return await cache.get_or_compute("a", compute), await cache.get_or_compute("a", compute)
+
+    assert asyncio.run(run()) == (None, "ok")
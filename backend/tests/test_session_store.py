@@ -0,0 +1,123 @@
+# Session store behaviour, run against both backends. The Redis one uses fakeredis,
+# with lupa for the Lua scripts (pip install -r tests/requirements.txt), so no server is needed:
+#
+#   cd backend && python -m pytest tests
+import pytest
+
+from risk_tracker import RiskTracker
+from session_store import InMemorySessionStore, RedisSessionStore
+
+TTL = 60
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    if request.param == "memory":
+        return InMemorySessionStore(ttl=TTL, max_messages=5, dedupe_window=2)
+    fakeredis = pytest.importorskip("fakeredis")
+    # fakeredis runs register_script() scripts through lupa
+    pytest.importorskip("lupa")
+    client = fakeredis.FakeRedis(decode_responses=True)
+    return RedisSessionStore(client, ttl=TTL, max_messages=5, dedupe_window=2)
+
+
+def message(text, role="user", time=1.0):
+    return {"role": role, "message": text, "time": time}
+
+
+def test_create_only_once(store):
+    assert store.create("c1", "+15550000000")
+    assert not store.create("c1", "+15559999999")
+
+    session = store.get("c1")
+    assert session["phone"] == "+15550000000"
+    assert session["user_name"] == "Unknown"
+    assert session["messages"] == []
+    assert store.active_count() == 1
+
+
+def test_append_and_fields(store):
+    store.create("c1", "+15550000000")
+    assert store.append_message("c1", message("hello"))
+    assert store.append_message("c1", message("how are you", role="bot", time=2.0))
+    store.set_field("c1", "user_name", "Sam")
+
+    session = store.get("c1")
+    assert [m["message"] for m in session["messages"]] == ["hello", "how are you"]
+    assert store.get_field("c1", "user_name") == "Sam"
+
+
+def test_append_needs_a_session(store):
+    assert not store.append_message("missing", message("hello"))
+    assert store.get("missing") is None
+
+
+def test_dedupe(store):
+    store.create("c1", "+15550000000")
+    assert store.append_message("c1", message("hello", time=1.0))
+    # Re-sent in a later speech-update
+    assert not store.append_message("c1", message("hello", time=1.0))
+    # Same utterance with a new timestamp, still within the recent window
+    assert not store.append_message("c1", message("hello", time=5.0))
+    # Same text from the other side is a different message
+    assert store.append_message("c1", message("hello", role="bot", time=6.0))
+    assert len(store.get("c1")["messages"]) == 2
+
+
+def test_messages_and_fingerprints_are_capped(store):
+    store.create("c1", "+15550000000")
+    for i in range(12):
+        assert store.append_message("c1", message(f"line {i}", time=float(i)))
+
+    assert [m["message"] for m in store.get("c1")["messages"]] == [f"line {i}" for i in range(7, 12)]
+    # Recent fingerprints are still remembered; ones trimmed with their messages are not
+    assert not store.append_message("c1", message("line 8", time=8.0))
+    assert store.append_message("c1", message("line 0", time=0.0))
+
+    if isinstance(store, RedisSessionStore):
+        assert store.client.zcard(store._keys("c1")[3]) == 5
+    else:
+        assert len(store._sessions["c1"]["seen"]) == 5
+
+
+def test_pop_returns_the_session_once(store):
+    store.create("c1", "+15550000000")
+    store.append_message("c1", message("hello"))
+
+    session = store.pop("c1")
+    assert [m["message"] for m in session["messages"]] == ["hello"]
+    assert store.pop("c1") is None
+    assert store.get("c1") is None
+    assert store.active_count() == 0
+
+
+def test_ttl(store, monkeypatch):
+    store.create("c1", "+15550000000")
+    store.append_message("c1", message("hello"))
+
+    if isinstance(store, RedisSessionStore):
+        for key in store._keys("c1"):
+            assert 0 < store.client.ttl(key) <= TTL
+        # What Redis does once the TTL runs out
+        store.client.delete(*store._keys("c1"))
+    import session_store
+    now = session_store.time.time()
+    monkeypatch.setattr(session_store.time, "time", lambda: now + TTL + 1)
+
+    assert store.get("c1") is None
+    assert store.active_count() == 0
+    assert not store.append_message("c1", message("late"))
+    assert store.create("c1", "+15550000000")
+    assert store.active_count() == 1
+
+
+def test_state_update_and_pop(store):
+    tracker = RiskTracker(store)
+    assert tracker.update("c1", {"distress": 40})["distress"] == 40
+    assert tracker.update("c1", {"distress": 10})["distress"] == 40 * 0.7 + 10 * 0.3
+
+    assert tracker.finish("c1")["distress"] == 40
+    # A score that lands after the final report must not recreate the state
+    assert tracker.update("c1", {"distress": 90}) is None
+    assert tracker.current("c1") is None
+    assert tracker.finish("c1") is None
@@ -0,0 +1,86 @@
+import random
+
+from triage import TriageQueue, composite_risk
+
+
+def order(queue):
+    return [entry["call_id"] for entry in queue.top_k(len(queue))]
+
+
+def test_composite_risk():
+    assert composite_risk([]) == 0.0
+    assert composite_risk([None, None]) == 0.0
+    assert composite_risk([80, 0, 0, 0]) == 0.7 * 80 + 0.3 * 20
+    # Scores outside 0-100 are clamped
+    assert composite_risk([500, -20]) == 0.7 * 100 + 0.3 * 50
+
+
+def test_highest_risk_first_then_arrival():
+    queue = TriageQueue(wait_weight=0)
+    queue.add(1, 20, enqueued_at=100)
+    queue.add(2, 90, enqueued_at=101)
+    queue.add(3, 20, enqueued_at=102)
+    queue.add(4, 55, enqueued_at=103)
+
+    assert order(queue) == [2, 4, 1, 3]
+    assert [queue.pop_next()["call_id"] for _ in range(4)] == [2, 4, 1, 3]
+    assert queue.pop_next() is None
+
+
+def test_wait_term():
+    queue = TriageQueue(wait_weight=0.1)
+    queue.add("waiting", 10, enqueued_at=0)
+    queue.add("risky", 40, enqueued_at=600)
+
+    # 10 minutes on hold is worth 60 points
+    assert queue.priority("waiting", now=600) == 10 + 60
+    assert queue.priority("risky", now=600) == 40
+    assert order(queue) == ["waiting", "risky"]
+
+
+def test_update_moves_a_call():
+    queue = TriageQueue(wait_weight=0)
+    for call_id in range(5):
+        queue.add(call_id, 10 * call_id, enqueued_at=call_id)
+
+    queue.update(0, 99)
+    queue.update(4, 1)
+    assert order(queue) == [0, 3, 2, 1, 4]
+    # Adding a call that is already queued updates it
+    queue.add(2, 50)
+    assert order(queue) == [0, 2, 3, 1, 4]
+    assert len(queue) == 5
+    # Unknown calls are ignored
+    queue.update("missing", 100)
+    assert "missing" not in queue
+
+
+def test_remove():
+    queue = TriageQueue(wait_weight=0)
+    for call_id in range(6):
+        queue.add(call_id, call_id, item=f"call {call_id}", enqueued_at=call_id)
+
+    assert queue.remove(3)["item"] == "call 3"
+    assert queue.remove(3) is None
+    assert 3 not in queue
+    assert order(queue) == [5, 4, 2, 1, 0]
+
+
+def test_random_operations_keep_heap_order():
+    rng = random.Random(7)
+    queue = TriageQueue(wait_weight=0)
+    risks = {}
+    for step in range(500):
+        call_id = rng.randrange(50)
+        action = rng.random()
+        if action < 0.5:
+            risks[call_id] = rng.uniform(0, 100)
+            queue.add(call_id, risks[call_id], enqueued_at=step)
+        elif action < 0.8 and call_id in risks:
+            risks[call_id] = rng.uniform(0, 100)
+            queue.update(call_id, risks[call_id])
+        else:
+            queue.remove(call_id)
+            risks.pop(call_id, None)
+
+    assert sorted(risks.values(), reverse=True) == [entry["risk"] for entry in queue.top_k(len(queue))]
@@ -0,0 +1,159 @@
+import heapq
+import threading
+import time
+
+
+def composite_risk(scores):
+    """
+    Single 0-100 score from the four risk scores, each on the service's 0-100 scale
+    (values outside it are clamped): the worst one dominates, the rest add context.
+    """
+    values = [min(max(s or 0, 0), 100) for s in scores]
+    if not values:
+        return 0.0
+    return 0.7 * max(values) + 0.3 * (sum(values) / len(values))
+
+
+class TriageQueue:
+    """
+    Waiting calls ordered by composite risk and time on hold.
+
+    A call's priority at time t is risk_weight * risk + wait_weight * (t - enqueued_at).
+    The t term is the same for every call, so the heap is keyed by
+    risk_weight * risk - wait_weight * enqueued_at and only has to move a call when
+    its risk changes: add, update and remove are O(log n), top_k is O(k log k).
+
+    Backed by an indexed binary max-heap (call id -> heap position) so a call can be
+    updated or removed in place.
+    """
+
+    def __init__(self, risk_weight=1.0, wait_weight=0.1):
+        # Risk is composite_risk's 0-100 and wait_weight is points per second on hold, so
+        # 0.1 = 6 points a minute: ten minutes on hold outweighs 60 points of risk
+        self.risk_weight = risk_weight
+        self.wait_weight = wait_weight
+        self._heap = []
+        self._index = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, call_id):
+        return call_id in self._index
+
+    def _key(self, risk, enqueued_at):
+        return self.risk_weight * risk - self.wait_weight * enqueued_at
+
+    def priority(self, call_id, now=None):
+        with self._lock:
+            entry = self._heap[self._index[call_id]]
+            return entry["key"] + self.wait_weight * (time.time() if now is None else now)
+
+    def add(self, call_id, risk, item=None, enqueued_at=None):
+        with self._lock:
+            if call_id in self._index:
+                return self._update(call_id, risk)
+            enqueued_at = time.time() if enqueued_at is None else enqueued_at
+            self._counter += 1
+            entry = {
+                "key": self._key(risk, enqueued_at),
+                "order": self._counter,
+                "call_id": call_id,
+                "risk": risk,
+                "enqueued_at": enqueued_at,
+                "item": item
+            }
+            self._heap.append(entry)
+            self._index[call_id] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+
+    def update(self, call_id, risk):
+        with self._lock:
+            if call_id in self._index:
+                self._update(call_id, risk)
+
+    def _update(self, call_id, risk):
+        position = self._index[call_id]
+        entry = self._heap[position]
+        entry["risk"] = risk
+        entry["key"] = self._key(risk, entry["enqueued_at"])
+        self._sift_up(position)
+        self._sift_down(self._index[call_id])
+
+    def remove(self, call_id):
+        with self._lock:
+            if call_id not in self._index:
+                return None
+            return self._remove_at(self._index[call_id])
+
+    def pop_next(self):
+        """Remove and return the highest-priority waiting call's entry, or None if nobody is waiting."""
+        with self._lock:
+            if not self._heap:
+                return None
+            return self._remove_at(0)
+
+    def top_k(self, k):
+        """The k highest-priority entries in order, without removing them."""
+        with self._lock:
+            result = []
+            if not self._heap:
+                return result
+            # Best-first walk of the heap: only the frontier of visited nodes is kept
+            frontier = [self._sort_key(0)]
+            while frontier and len(result) < k:
+                _, _, position = heapq.heappop(frontier)
+                result.append(dict(self._heap[position]))
+                for child in (2 * position + 1, 2 * position + 2):
+                    if child < len(self._heap):
+                        heapq.heappush(frontier, self._sort_key(child))
+            return result
+
+    def _sort_key(self, position):
+        entry = self._heap[position]
+        return (-entry["key"], entry["order"], position)
+
+    def _higher(self, a, b):
+        first, second = self._heap[a], self._heap[b]
+        if first["key"] != second["key"]:
+            return first["key"] > second["key"]
+        return first["order"] < second["order"]
+
+    def _swap(self, a, b):
+        self._heap[a], self._heap[b] = self._heap[b], self._heap[a]
+        self._index[self._heap[a]["call_id"]] = a
+        self._index[self._heap[b]["call_id"]] = b
+
+    def _sift_up(self, position):
+        while position > 0:
+            parent = (position - 1) // 2
+            if not self._higher(position, parent):
+                break
+            self._swap(position, parent)
+            position = parent
+
+    def _sift_down(self, position):
+        size = len(self._heap)
+        while True:
+            best = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and self._higher(child, best):
+                    best = child
+            if best == position:
+                break
+            self._swap(position, best)
+            position = best
+
+    def _remove_at(self, position):
+        last = len(self._heap) - 1
+        if position != last:
+            self._swap(position, last)
+        entry = self._heap.pop()
+        del self._index[entry["call_id"]]
+        if position < len(self._heap):
+            moved = self._heap[position]["call_id"]
+            self._sift_up(position)
+            self._sift_down(self._index[moved])
+        return entry
@@ -77,6 +77,14 @@ const CallLogTile = ({ call, onViewDetails }) => {
           >
             {call.priority}
           </span>
+          {call.queuePosition !== undefined && (
+            <span
+              className="ml-2 px-2.5 py-1 rounded-md text-xs font-medium border bg-gray-100 text-gray-800 border-gray-200"
+              title="Position in the queue for a human agent"
+            >
+              #{call.queuePosition} in queue
+            </span>
+          )}
         </div>
         <h3 className="text-lg font-semibold text-gray-800">
           {call.user_phone}
@@ -1,13 +1,23 @@
 import React from 'react'
 import { useCallContext } from '../contexts/CallContext'
-import { WifiIcon, WifiOffIcon, ClockIcon } from 'lucide-react'
+import { WifiIcon, WifiOffIcon, ClockIcon, GaugeIcon } from 'lucide-react'
 
 const ConnectionStatus: React.FC = () => {
-  const { connectionStatus } = useCallContext()
+  const { connectionStatus, pipelineStatus } = useCallContext()
 
   const getStatusConfig = () => {
     switch (connectionStatus) {
       case 'connected':
+        // The backend is queueing updates faster than it sends them, so what we show may lag
+        if (pipelineStatus && pipelineStatus.level !== 'ok') {
+          const saturated = pipelineStatus.level === 'saturated'
+          return {
+            icon: GaugeIcon,
+            color: saturated ? 'text-orange-600' : 'text-yellow-600',
+            bgColor: saturated ? 'bg-orange-100' : 'bg-yellow-100',
+            text: saturated ? 'Live Updates (backlogged)' : 'Live Updates (delayed)'
+          }
+        }
         return {
           icon: WifiIcon,
           color: 'text-green-600',
@@ -33,9 +43,17 @@ const ConnectionStatus: React.FC = () => {
 
   const config = getStatusConfig()
   const IconComponent = config.icon
+  const stageFills = pipelineStatus
+    ? Object.entries(pipelineStatus.stages)
+        .map(([name, stage]) => `${name}: ${Math.round(stage.fill * 100)}%`)
+        .join(', ')
+    : undefined
 
   return (
-    <div className={`flex items-center px-3 py-1 rounded-full text-sm font-medium ${config.bgColor} ${config.color}`}>
+    <div
+      className={`flex items-center px-3 py-1 rounded-full text-sm font-medium ${config.bgColor} ${config.color}`}
+      title={stageFills}
+    >
       <IconComponent size={16} className="mr-2" />
       {config.text}
     </div>
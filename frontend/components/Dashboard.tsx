@@ -1,7 +1,8 @@
-import React, { useState } from 'react'
+import React, { useEffect, useState } from 'react'
 import CallLogTile from './CallLogTile'
 import CallDetailsSidebar from './CallDetailsSidebar'
 import { useCallContext } from '../contexts/CallContext'
+import { websocketService } from '../services/websocketService'
 import {
   PhoneIcon,
   AlertTriangleIcon,
@@ -14,6 +15,14 @@ const Dashboard = () => {
 
   const selectedCall = calls.find((call) => call.id === selectedCallId)
 
+  // Only the open call's room is joined: the lobby already carries every call's
+  // risk and status, the live transcript is only needed in the sidebar
+  useEffect(() => {
+    if (selectedCallId === null) return
+    websocketService.subscribeCall(selectedCallId)
+    return () => websocketService.unsubscribeCall(selectedCallId)
+  }, [selectedCallId])
+
   const inProgressCalls = calls.filter(
     (call) => call.status === 'in-progress',
   )
@@ -6,7 +6,7 @@ import React, {
   ReactNode
 } from 'react';
 import { callLogs as initialCallLogs } from '../utils/mockData';
-import { websocketService } from '../services/websocketService';
+import { websocketService, CallDelta, CallSnapshot, PipelineStatus, QueueUpdate } from '../services/websocketService';
 
 interface TranscriptChunk {
   role: string;
@@ -34,6 +34,8 @@ interface Call {
   date?: string;
   time?: string;
   isNew?: boolean;
+  // Place in the triage queue for a human agent, for calls near its head
+  queuePosition?: number;
 }
 
 interface CallContextType {
@@ -42,6 +44,7 @@ interface CallContextType {
   updateCall: (callId: number, updates: Partial<Call>) => void;
   addCall: (call: Call) => void;
   connectionStatus: 'connected' | 'disconnected' | 'connecting';
+  pipelineStatus: PipelineStatus | null;
 }
 
 const CallContext = createContext<CallContextType | undefined>(undefined);
@@ -76,35 +79,46 @@ export const CallProvider: React.FC<CallProviderProps> = ({ children }) => {
   const [calls, setCalls] = useState<Call[]>(convertedInitialCalls);
   const [connectionStatus, setConnectionStatus] = useState<'connected' | 'disconnected' | 'connecting'>('disconnected');
   const [nextId, setNextId] = useState(1000);
+  // Backend queue saturation, pushed while it is busy so the dashboard can show that updates may lag
+  const [pipelineStatus, setPipelineStatus] = useState<PipelineStatus | null>(null);
 
   useEffect(() => {
     setConnectionStatus('connecting');
     websocketService.connect();
 
-    const handleNewCall = (callData: any) => {
-      console.log('🆕 New call received in context:', callData);
-      const uniqueId = callData.id || nextId;
-      const newCall: Call = {
-        id: uniqueId,
+    // Latest triage queue positions by call id; also applied to calls loaded after the update
+    let queuePositions = new Map<number, number>();
+
+    // Builds a dashboard call from backend CallData fields (live event or stored history)
+    const callFromData = (callData: any, id: number, transcriptChunks: TranscriptChunk[] = []): Call => {
+      const startedAt = callData.started_at ? new Date(callData.started_at * 1000) : new Date();
+      return {
+        id,
         user_phone: callData.user_phone,
         user_name: callData.user_name || 'Unknown',
         call_duration: callData.call_duration || '0.0',
-        status: 'in-progress',
+        status: callData.status || 'in-progress',
         topic: callData.summary?.split(' ')[0] || 'General',
         summary: callData.summary || 'Call in progress...',
         priority: callData.call_priority || 'Normal',
         transcript: callData.call_transcript || '',
-        transcriptChunks: [],
+        transcriptChunks,
         riskAssessment: {
           selfHarm: callData.self_harm_percentage || 0,
           distress: callData.distress_percentage || 0,
           homicidal: callData.homicidal_percentage || 0,
           psychosis: callData.psychosis_percentage || 0
         },
-        date: new Date().toLocaleDateString(),
-        time: new Date().toLocaleTimeString(),
-        isNew: true
+        date: startedAt.toLocaleDateString(),
+        time: startedAt.toLocaleTimeString(),
+        queuePosition: queuePositions.get(id)
       };
+    };
+
+    const handleNewCall = (callData: any) => {
+      console.log('🆕 New call received in context:', callData);
+      const uniqueId = callData.id || nextId;
+      const newCall: Call = { ...callFromData(callData, uniqueId), isNew: true };
 
       setCalls(prev => [newCall, ...prev]);
       // bump nextId if needed
@@ -141,6 +155,15 @@ export const CallProvider: React.FC<CallProviderProps> = ({ children }) => {
     const handleConnected = () => {
       setConnectionStatus('connected');
       console.log('✅ WebSocket connected');
+
+      // One snapshot of live and recent calls replaces whatever we were showing
+      websocketService.fetchSnapshot().then(snapshot => {
+        if (!snapshot) return;
+        setCalls([
+          ...snapshot.live.map(live => callFromData(live.state, live.call_id, live.transcript_chunks)),
+          ...snapshot.recent.map(call => callFromData(call, call.id))
+        ]);
+      });
     };
 
     const handleDisconnected = () => {
@@ -156,16 +179,6 @@ export const CallProvider: React.FC<CallProviderProps> = ({ children }) => {
       );
     };
 
-    const handleRiskAssessmentUpdate = (data: any) => {
-      setCalls(prev =>
-        prev.map(call =>
-          call.id === data.call_id
-            ? { ...call, riskAssessment: data.risk_assessment }
-            : call
-        )
-      );
-    };
-
     const handleTranscriptUpdate = (data: any) => {
       setCalls(prev =>
         prev.map(call =>
@@ -199,15 +212,67 @@ export const CallProvider: React.FC<CallProviderProps> = ({ children }) => {
       );
     };
 
+    // Applies backend CallData fields (full or partial) on top of a dashboard call
+    const mergeCallFields = (call: Call, fields: any): Call => ({
+      ...call,
+      user_name: fields.user_name ?? call.user_name,
+      status: fields.status ?? call.status,
+      call_duration: fields.call_duration ?? call.call_duration,
+      summary: fields.summary ?? call.summary,
+      priority: fields.call_priority ?? call.priority,
+      transcript: fields.call_transcript ?? call.transcript,
+      riskAssessment: {
+        selfHarm: fields.self_harm_percentage ?? call.riskAssessment.selfHarm,
+        distress: fields.distress_percentage ?? call.riskAssessment.distress,
+        homicidal: fields.homicidal_percentage ?? call.riskAssessment.homicidal,
+        psychosis: fields.psychosis_percentage ?? call.riskAssessment.psychosis
+      }
+    });
+
+    const handleCallDelta = (delta: CallDelta) => {
+      setCalls(prev =>
+        prev.map(call => {
+          if (call.id !== delta.call_id) return call;
+          const updated = mergeCallFields(call, delta.changes);
+          if (delta.append?.length) {
+            updated.transcriptChunks = [...(call.transcriptChunks || []), ...delta.append];
+          }
+          return updated;
+        })
+      );
+    };
+
+    const handleCallSnapshot = (snapshot: CallSnapshot) => {
+      setCalls(prev =>
+        prev.map(call =>
+          call.id === snapshot.call_id
+            ? { ...mergeCallFields(call, snapshot.state), transcriptChunks: snapshot.transcript_chunks }
+            : call
+        )
+      );
+    };
+
+    const handlePipelineStatus = (status: PipelineStatus) => {
+      setPipelineStatus(status);
+    };
+
+    const handleQueueUpdate = (update: QueueUpdate) => {
+      queuePositions = new Map(update.positions.map((entry): [number, number] => [entry.call_id, entry.position]));
+      setCalls(prev => prev.map(call => ({ ...call, queuePosition: queuePositions.get(call.id) })));
+    };
+
     websocketService.on('newCall', handleNewCall);
     websocketService.on('callUpdate', handleCallUpdate);
     websocketService.on('callEnd', handleCallEnd);
     websocketService.on('connected', handleConnected);
     websocketService.on('disconnected', handleDisconnected);
     websocketService.on('callStatusUpdate', handleCallStatusUpdate);
-    websocketService.on('riskAssessmentUpdate', handleRiskAssessmentUpdate);
     websocketService.on('transcriptUpdate', handleTranscriptUpdate);
     websocketService.on('liveTranscriptUpdate', handleLiveTranscriptUpdate);
+    websocketService.on('callDelta', handleCallDelta);
+    websocketService.on('callSnapshot', handleCallSnapshot);
+    websocketService.on('pipelineStatus', handlePipelineStatus);
+    websocketService.on('queueUpdate', handleQueueUpdate);
 
     return () => {
       websocketService.off('newCall', handleNewCall);
@@ -216,9 +281,12 @@ export const CallProvider: React.FC<CallProviderProps> = ({ children }) => {
       websocketService.off('connected', handleConnected);
       websocketService.off('disconnected', handleDisconnected);
       websocketService.off('callStatusUpdate', handleCallStatusUpdate);
-      websocketService.off('riskAssessmentUpdate', handleRiskAssessmentUpdate);
       websocketService.off('transcriptUpdate', handleTranscriptUpdate);
       websocketService.off('liveTranscriptUpdate', handleLiveTranscriptUpdate);
+      websocketService.off('callDelta', handleCallDelta);
+      websocketService.off('callSnapshot', handleCallSnapshot);
+      websocketService.off('pipelineStatus', handlePipelineStatus);
+      websocketService.off('queueUpdate', handleQueueUpdate);
       websocketService.disconnect();
     };
   }, []);
@@ -239,7 +307,7 @@ export const CallProvider: React.FC<CallProviderProps> = ({ children }) => {
 
   return (
     <CallContext.Provider
-      value={{ calls, removeCall, updateCall, addCall, connectionStatus }}
+      value={{ calls, removeCall, updateCall, addCall, connectionStatus, pipelineStatus }}
     >
       {children}
     </CallContext.Provider>
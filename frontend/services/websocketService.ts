@@ -14,18 +14,62 @@ export interface CallData {
   summary: string;
 }
 
+export interface CallDelta {
+  call_id: number;
+  seq: number;
+  // Only on deltas sent to the lobby, numbered separately from seq
+  lobby_seq?: number;
+  changes: Partial<CallData>;
+  append?: { role: string; message: string; time?: number }[];
+}
+
+export interface CallSnapshot {
+  call_id: number;
+  seq: number;
+  lobby_seq: number;
+  state: CallData;
+  transcript_chunks: { role: string; message: string; time?: number }[];
+}
+
+export interface PipelineStatus {
+  level: "ok" | "busy" | "saturated";
+  fill: number;
+  stages: Record<string, { fill: number; [key: string]: number }>;
+}
+
+// Head of the triage queue, sent whenever its order changes
+export interface QueueUpdate {
+  queue_size: number;
+  positions: { call_id: number; position: number; risk: number }[];
+}
+
+export interface CallsSnapshot {
+  live: CallSnapshot[];
+  recent: (CallData & { status: string; started_at: number })[];
+}
+
 class WebSocketService {
+  private url = "http://localhost:5001";
   private socket: ReturnType<typeof io> | null = null;
   private reconnectAttempts = 0;
   private maxReconnectAttempts = 5;
   private reconnectDelay = 1000;
   private eventListeners: Map<string, Function[]> = new Map();
   private isConnecting = false;
+  // Calls whose room we joined (the ones open in the dashboard) and the last delta seq
+  // applied for each, used to catch up after a missing seq or a reconnect
+  private subscribed: Set<number> = new Set();
+  private lastSeq: Map<number, number> = new Map();
+  // calls resubscribed after a missing seq, whose deltas are ignored until the catch-up arrives
+  private catchingUp: Set<number> = new Set();
+  // call id -> last lobby_seq applied, for every live call
+  private lobbySeq: Map<number, number> = new Map();
 
   connect(url: string = "http://localhost:5001") {
     if (this.isConnecting || this.socket?.connected) return;
 
     try {
+      this.url = url;
       this.isConnecting = true;
       this.socket = io(url, {
         reconnectionAttempts: this.maxReconnectAttempts,
@@ -38,6 +82,8 @@ class WebSocketService {
         this.isConnecting = false;
         this.emit("connected");
         this.socket?.emit("frontend_ready");
+        // Rejoin call rooms after a reconnect, replaying whatever was missed
+        this.subscribed.forEach((callId) => this.subscribeCall(callId, this.lastSeq.get(callId)));
       });
 
       this.socket.on("disconnect", () => {
@@ -51,21 +97,70 @@ class WebSocketService {
         this.isConnecting = false;
       });
 
-      this.socket.on("new_call", (callData: CallData) => {
+      this.socket.on("new_call", (callData: CallData & { seq?: number; lobby_seq?: number }) => {
         console.log("📞 Received new call via WebSocket:", callData);
+        this.lobbySeq.set(callData.id, callData.lobby_seq ?? 0);
         this.emit("newCall", callData);
       });
 
+      this.socket.on("call_delta", (delta: CallDelta) => {
+        if (delta.lobby_seq !== undefined) {
+          const lobbySeq = this.lobbySeq.get(delta.call_id) ?? 0;
+          this.lobbySeq.set(delta.call_id, Math.max(lobbySeq, delta.lobby_seq));
+          if (!this.subscribed.has(delta.call_id)) {
+            // Lobby deltas carry every field change since the previous one, so there is
+            // nothing to catch up; the transcript is only followed for open calls
+            if (delta.lobby_seq > lobbySeq) this.emit("callDelta", { ...delta, append: undefined });
+            return;
+          }
+        }
+        if (!this.subscribed.has(delta.call_id)) return;
+
+        const lastSeq = this.lastSeq.get(delta.call_id);
+        // Until the subscription's snapshot arrives, it covers everything
+        if (lastSeq === undefined || delta.seq <= lastSeq) return;
+        // A skipped seq means the server applied an update without sending it (it was
+        // overloaded); ask for what we missed instead of applying out of order
+        if (delta.seq > lastSeq + 1) {
+          if (!this.catchingUp.has(delta.call_id)) {
+            this.catchingUp.add(delta.call_id);
+            this.socket?.emit("subscribe", { call_id: delta.call_id, since_seq: lastSeq });
+          }
+          return;
+        }
+        this.catchingUp.delete(delta.call_id);
+        this.lastSeq.set(delta.call_id, delta.seq);
+        this.emit("callDelta", delta);
+      });
+
+      // The server stopped tracking the call (it ended and its last updates went out)
+      this.socket.on("call_closed", (data: { call_id: number }) => {
+        this.lobbySeq.delete(data.call_id);
+        this.lastSeq.delete(data.call_id);
+        this.catchingUp.delete(data.call_id);
+      });
+
+      this.socket.on("pipeline_status", (status: PipelineStatus) => {
+        this.emit("pipelineStatus", status);
+      });
+
+      this.socket.on("queue_update", (data: QueueUpdate) => {
+        this.emit("queueUpdate", data);
+      });
+
+      this.socket.on("call_snapshot", (snapshot: CallSnapshot) => {
+        console.log("🧾 Received call snapshot:", snapshot);
+        this.catchingUp.delete(snapshot.call_id);
+        this.lobbySeq.set(snapshot.call_id, Math.max(this.lobbySeq.get(snapshot.call_id) ?? 0, snapshot.lobby_seq));
+        if (this.subscribed.has(snapshot.call_id)) this.lastSeq.set(snapshot.call_id, snapshot.seq);
+        this.emit("callSnapshot", snapshot);
+      });
+
       this.socket.on("call_status_update", (data: any) => {
         console.log("🔄 Received call status update:", data);
         this.emit("callStatusUpdate", data);
       });
 
-      this.socket.on("risk_assessment_update", (data: any) => {
-        console.log("⚠️ Received risk assessment update:", data);
-        this.emit("riskAssessmentUpdate", data);
-      });
-
       this.socket.on("transcript_update", (data: any) => {
         console.log("📝 Received transcript update:", data);
         this.emit("transcriptUpdate", data);
@@ -82,6 +177,37 @@ class WebSocketService {
     }
   }
 
+  async fetchSnapshot(): Promise<CallsSnapshot | null> {
+    try {
+      const response = await fetch(`${this.url}/calls/snapshot`);
+      if (!response.ok) return null;
+      const snapshot: CallsSnapshot = await response.json();
+      // Calls that ended while we weren't listening are forgotten here
+      this.lobbySeq = new Map(snapshot.live.map((live): [number, number] => [live.call_id, live.lobby_seq]));
+      return snapshot;
+    } catch (error) {
+      console.error("❌ Failed to fetch call snapshot:", error);
+      return null;
+    }
+  }
+
+  // Follow a call's transcript and every delta, e.g. while it is open in the dashboard.
+  // Without sinceSeq the server answers with a snapshot.
+  subscribeCall(callId: number, sinceSeq?: number) {
+    this.subscribed.add(callId);
+    if (sinceSeq !== undefined && !this.lastSeq.has(callId)) {
+      this.lastSeq.set(callId, sinceSeq);
+    }
+    this.socket?.emit("subscribe", { call_id: callId, since_seq: sinceSeq ?? null });
+  }
+
+  unsubscribeCall(callId: number) {
+    this.subscribed.delete(callId);
+    this.lastSeq.delete(callId);
+    this.catchingUp.delete(callId);
+    this.socket?.emit("unsubscribe", { call_id: callId });
+  }
+
   on(event: string, callback: Function) {
     if (!this.eventListeners.has(event)) {
       this.eventListeners.set(event, []);